@@ -3,21 +3,394 @@
 
 Notice: This script has been vibe coded with Gemini.
 
-This script takes paths to repository files (YAML files common in ROS 2) for two
-ROS distributions (new and old) and compares them, outputting probably new commits to a CSV file.
+This script takes paths to repository files (YAML files common in ROS 2) for a
+new ROS distribution and one or more old ones and compares them, outputting probably
+new commits to a CSV file with a column per old distribution.
 """
 
 import argparse
-from collections.abc import Iterator
+import asyncio
+import codecs
+from collections import defaultdict
+from collections.abc import Callable, Generator, Iterable, Iterator
+import contextvars
 import csv
-from dataclasses import dataclass
+from contextlib import contextmanager
+from dataclasses import asdict, dataclass
 from difflib import SequenceMatcher
 from functools import cached_property
+import hashlib
+import io
+import json
+import locale
+import os
+import random
 import re
+import shutil
 import subprocess
+import sys
 import tempfile
+import threading
+import time
+from typing import TypeVar
 import yaml
 
+from git_urls import normalize_git_url
+
+
+# ASCII record/unit separators used to delimit fields in `git log` output
+_RECORD_SEP = "\x1e"
+_FIELD_SEP = "\x1f"
+
+# Bytes read at a time from git processes whose output is streamed
+_STREAM_CHUNK_SIZE = 1 << 16
+
+
+@dataclass
+class PhaseStats:
+    """Wall time and number of subprocesses spent in one phase of the work."""
+
+    wall_time: float = 0.0
+    subprocesses: int = 0
+
+
+class Profiler:
+    """Records wall time and subprocess counts per phase and per repository.
+
+    Phases may be nested, in which case time spent in the inner phase is not
+    counted for the outer one. Subprocesses are counted for the innermost
+    phase. The current phase and repository are tracked per thread and per
+    asyncio task, so repositories compared concurrently are profiled
+    separately.
+    """
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._stack: contextvars.ContextVar[tuple[list, ...]] = contextvars.ContextVar(
+            "profiler_stack", default=()
+        )
+        self._repository: contextvars.ContextVar[str | None] = contextvars.ContextVar(
+            "profiler_repository", default=None
+        )
+        # Phase statistics by repository name. Work done outside of any
+        # repository is recorded under None.
+        self.phases: dict[str | None, dict[str, PhaseStats]] = {}
+        self.repository_wall_times: dict[str, float] = {}
+
+    def _stats(self, phase: str) -> PhaseStats:
+        phases = self.phases.setdefault(self._repository.get(), {})
+        return phases.setdefault(phase, PhaseStats())
+
+    def _add_time(self, entry: list, now: float) -> None:
+        with self._lock:
+            self._stats(entry[0]).wall_time += now - entry[1]
+        entry[1] = now
+
+    @contextmanager
+    def repository(self, name: str) -> Iterator[None]:
+        """Attribute work done by the current thread or task to a repository."""
+        token = self._repository.set(name)
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            with self._lock:
+                self.repository_wall_times[name] = time.perf_counter() - start
+            self._repository.reset(token)
+
+    @contextmanager
+    def phase(self, name: str) -> Iterator[None]:
+        """Attribute work done by the current thread or task to a phase."""
+        stack = self._stack.get()
+        if stack:
+            self._add_time(stack[-1], time.perf_counter())
+        entry = [name, time.perf_counter()]
+        token = self._stack.set(stack + (entry,))
+        try:
+            yield
+        finally:
+            now = time.perf_counter()
+            self._add_time(entry, now)
+            self._stack.reset(token)
+            if stack:
+                stack[-1][1] = now
+
+    def count_subprocess(self) -> None:
+        """Count a subprocess started by the current thread or task."""
+        stack = self._stack.get()
+        with self._lock:
+            self._stats(stack[-1][0] if stack else "other").subprocesses += 1
+
+    def report(self) -> dict:
+        """Get all recorded statistics as a JSON serializable dict."""
+        with self._lock:
+            totals: dict[str, PhaseStats] = defaultdict(PhaseStats)
+            for phases in self.phases.values():
+                for phase, stats in phases.items():
+                    totals[phase].wall_time += stats.wall_time
+                    totals[phase].subprocesses += stats.subprocesses
+            return {
+                "phases": {p: asdict(stats) for p, stats in totals.items()},
+                "outside_repositories": {
+                    p: asdict(stats) for p, stats in self.phases.get(None, {}).items()
+                },
+                "repositories": {
+                    name: {
+                        "wall_time": wall_time,
+                        "subprocesses": sum(
+                            stats.subprocesses
+                            for stats in self.phases.get(name, {}).values()
+                        ),
+                        "phases": {
+                            p: asdict(stats)
+                            for p, stats in self.phases.get(name, {}).items()
+                        },
+                    }
+                    for name, wall_time in self.repository_wall_times.items()
+                },
+            }
+
+
+profiler = Profiler()
+
+
+def _run(args: list[str], **kwargs) -> subprocess.CompletedProcess:
+    """Run a subprocess, counting it in the current profiling phase."""
+    profiler.count_subprocess()
+    return subprocess.run(args, **kwargs)
+
+
+def _popen(args: list[str], **kwargs) -> subprocess.Popen:
+    """Start a subprocess, counting it in the current profiling phase."""
+    profiler.count_subprocess()
+    return subprocess.Popen(args, **kwargs)
+
+
+@dataclass
+class GitCommand:
+    """A git command to be run by run_git_ops() or run_git_ops_async().
+
+    Code that needs git is written as generators which yield GitCommands and
+    are sent back a GitResult for each one. The same generator can then be
+    driven with blocking subprocesses or with asyncio subprocesses.
+    """
+
+    args: list[str]
+    cwd: str | None = None
+    # Text written to the standard input of the command
+    input: str | None = None
+    check: bool = True
+    # When False output goes to the terminal, e.g. the progress of a clone
+    capture_output: bool = True
+    errors: str = "strict"
+    # Another command whose standard output is piped into this one
+    stdin_from: "GitCommand | None" = None
+    # Called with every line of standard output as it is read, instead of
+    # collecting it in GitResult.stdout. Standard error goes to the terminal.
+    on_line: Callable[[str], None] | None = None
+
+
+@dataclass
+class GitResult:
+    """The outcome of a GitCommand."""
+
+    returncode: int
+    stdout: str
+    stderr: str
+
+
+T = TypeVar("T")
+GitOps = Generator[GitCommand, GitResult, T]
+
+
+def _check_git_command(command: GitCommand, returncode: int) -> None:
+    if command.check and returncode != 0:
+        raise subprocess.CalledProcessError(returncode, command.args)
+
+
+def _run_git_command(command: GitCommand) -> GitResult:
+    output = subprocess.PIPE if command.capture_output else None
+    if command.on_line is not None:
+        process = _popen(
+            command.args,
+            cwd=command.cwd,
+            stdout=subprocess.PIPE,
+            text=True,
+            errors=command.errors,
+        )
+        with process:
+            for line in process.stdout:
+                command.on_line(line)
+        _check_git_command(command, process.returncode)
+        return GitResult(process.returncode, "", "")
+    if command.stdin_from is None:
+        result = _run(
+            command.args,
+            cwd=command.cwd,
+            input=command.input,
+            stdout=output,
+            stderr=output,
+            text=True,
+            errors=command.errors,
+        )
+    else:
+        source = _popen(
+            command.stdin_from.args,
+            cwd=command.stdin_from.cwd,
+            stdout=subprocess.PIPE,
+        )
+        with source:
+            result = _run(
+                command.args,
+                cwd=command.cwd,
+                stdin=source.stdout,
+                stdout=output,
+                stderr=output,
+                text=True,
+                errors=command.errors,
+            )
+        _check_git_command(command.stdin_from, source.returncode)
+    _check_git_command(command, result.returncode)
+    return GitResult(result.returncode, result.stdout or "", result.stderr or "")
+
+
+def run_git_ops(ops: GitOps[T]) -> T:
+    """Run the git commands yielded by ops one by one and return its result."""
+    try:
+        command = next(ops)
+        while True:
+            try:
+                result = _run_git_command(command)
+            except BaseException as error:
+                # Let the generator clean up, e.g. leave its profiling phase
+                command = ops.throw(error)
+            else:
+                command = ops.send(result)
+    except StopIteration as stop:
+        return stop.value
+
+
+# Limits the number of git processes run at once by run_git_ops_async()
+_git_process_slots: asyncio.Semaphore | None = None
+
+
+def set_git_process_limit(limit: int) -> None:
+    """Set how many git processes run_git_ops_async() may run at once."""
+    global _git_process_slots
+    _git_process_slots = asyncio.Semaphore(limit)
+
+
+async def _run_git_command_async(command: GitCommand) -> GitResult:
+    global _git_process_slots
+    if _git_process_slots is None:
+        _git_process_slots = asyncio.Semaphore(os.cpu_count() or 1)
+    encoding = locale.getpreferredencoding(False)
+    output = asyncio.subprocess.PIPE if command.capture_output else None
+    async with _git_process_slots:
+        source = None
+        stdin = None if command.input is None else asyncio.subprocess.PIPE
+        if command.stdin_from is not None:
+            read_fd, write_fd = os.pipe()
+            try:
+                profiler.count_subprocess()
+                source = await asyncio.create_subprocess_exec(
+                    *command.stdin_from.args,
+                    cwd=command.stdin_from.cwd,
+                    stdout=write_fd,
+                )
+            finally:
+                os.close(write_fd)
+            stdin = read_fd
+        try:
+            profiler.count_subprocess()
+            process = await asyncio.create_subprocess_exec(
+                *command.args,
+                cwd=command.cwd,
+                stdin=stdin,
+                stdout=output if command.on_line is None else asyncio.subprocess.PIPE,
+                stderr=output if command.on_line is None else None,
+            )
+        finally:
+            if source is not None:
+                os.close(read_fd)
+        if command.on_line is None:
+            stdout, stderr = await process.communicate(
+                None if command.input is None else command.input.encode(encoding)
+            )
+        else:
+            try:
+                await _stream_lines(
+                    process.stdout, encoding, command.errors, command.on_line
+                )
+            except BaseException:
+                # Don't leave git blocked on a full pipe nobody reads anymore
+                if process.returncode is None:
+                    process.kill()
+                raise
+            finally:
+                await process.wait()
+            stdout = stderr = None
+        if source is not None:
+            _check_git_command(command.stdin_from, await source.wait())
+    _check_git_command(command, process.returncode)
+    return GitResult(
+        process.returncode,
+        _decode_text(stdout, encoding, command.errors),
+        _decode_text(stderr, encoding, "replace"),
+    )
+
+
+async def _stream_lines(
+    stream: asyncio.StreamReader,
+    encoding: str,
+    errors: str,
+    on_line: Callable[[str], None],
+) -> None:
+    """Call on_line with every line of a stream, with universal newlines like subprocess text mode."""
+    decoder = codecs.getincrementaldecoder(encoding)(errors)
+    pending = ""
+    while True:
+        data = await stream.read(_STREAM_CHUNK_SIZE)
+        text = pending + decoder.decode(data, final=not data)
+        # A trailing "\r" may be the first half of a "\r\n" in the next chunk
+        carry = ""
+        if data and text.endswith("\r"):
+            text, carry = text[:-1], "\r"
+        *lines, pending = text.replace("\r\n", "\n").replace("\r", "\n").split("\n")
+        for line in lines:
+            on_line(line + "\n")
+        pending += carry
+        if not data:
+            if pending:
+                on_line(pending)
+            return
+
+
+def _decode_text(data: bytes | None, encoding: str, errors: str) -> str:
+    """Decode process output with universal newlines like subprocess text mode."""
+    text = (data or b"").decode(encoding, errors)
+    return text.replace("\r\n", "\n").replace("\r", "\n")
+
+
+async def run_git_ops_async(ops: GitOps[T]) -> T:
+    """Like run_git_ops(), but run the git commands as asyncio subprocesses.
+
+    At most as many git processes as set by set_git_process_limit() run at
+    once across all tasks, one per CPU by default.
+    """
+    try:
+        command = next(ops)
+        while True:
+            try:
+                result = await _run_git_command_async(command)
+            except BaseException as error:
+                # Let the generator clean up, e.g. leave its profiling phase
+                command = ops.throw(error)
+            else:
+                command = ops.send(result)
+    except StopIteration as stop:
+        return stop.value
+
 
 @dataclass
 class Repository:
@@ -55,41 +428,79 @@ class ModifiedFile:
     @cached_property
     def patch(self) -> str:
         """Get the diff/patch for this specific file."""
-        result = subprocess.run(
-            [
-                "git",
-                "show",
-                "--format=",
-                self._commit_hash,
-                "--",
-                self.filename,
-            ],
-            cwd=self._repo_path,
-            capture_output=True,
-            text=True,
-            check=True,
-        )
+        return run_git_ops(self._patch_ops())
+
+    def _patch_ops(self) -> GitOps[str]:
+        with profiler.phase("metadata"):
+            result = yield GitCommand(
+                [
+                    "git",
+                    "show",
+                    "--format=",
+                    self._commit_hash,
+                    "--",
+                    self.filename,
+                ],
+                cwd=self._repo_path,
+            )
         return result.stdout.strip()
 
 
+def parse_numstat(
+    repo_path: str, commit_hash: str, lines: Iterable[str]
+) -> list[ModifiedFile]:
+    """Parse `git --numstat` output lines into ModifiedFile instances.
+
+    Args:
+        repo_path (str): Path to the git repository.
+        commit_hash (str): The commit the numstat lines belong to.
+        lines (Iterable[str]): Lines of numstat output. Blank lines are ignored.
+
+    Returns:
+        list[ModifiedFile]: One entry per modified file.
+    """
+    files = []
+    for line in lines:
+        parts = line.split(maxsplit=2)
+        if len(parts) == 3:
+            add_str, rem_str, filename = parts
+            try:
+                added = int(add_str)
+            except ValueError:
+                added = 0
+            try:
+                removed = int(rem_str)
+            except ValueError:
+                removed = 0
+            files.append(
+                ModifiedFile(repo_path, commit_hash, filename, added, removed)
+            )
+    return files
+
+
 class Commit:
     """Represents a git commit with cached accessors for its metadata and changes."""
 
-    def __init__(self, repo_path: str, commit_hash: str) -> None:
+    def __init__(
+        self,
+        repo_path: str,
+        commit_hash: str,
+        message: str | None = None,
+        modified_files: list[ModifiedFile] | None = None,
+    ) -> None:
         self._repo_path = repo_path
         self.hash = commit_hash
+        # Metadata read in bulk by ClonedRepository.iterate_commits() pre-fills
+        # the cached properties so no per-commit subprocess is needed.
+        if message is not None:
+            self.message = message
+        if modified_files is not None:
+            self.modified_files = modified_files
 
     @cached_property
     def message(self) -> str:
         """Get the commit message."""
-        result = subprocess.run(
-            ["git", "log", "--format=%B", "-n", "1", self.hash],
-            cwd=self._repo_path,
-            capture_output=True,
-            text=True,
-            check=True,
-        )
-        return result.stdout.strip()
+        return run_git_ops(self._message_ops())
 
     @cached_property
     def first_message_line(self) -> str:
@@ -99,32 +510,32 @@ class Commit:
     @cached_property
     def modified_files(self) -> list[ModifiedFile]:
         """Get the list of files modified in this commit."""
-        result = subprocess.run(
-            ["git", "show", "--numstat", "--format=", self.hash],
-            cwd=self._repo_path,
-            capture_output=True,
-            text=True,
-            check=True,
+        return run_git_ops(self._modified_files_ops())
+
+    def _message_ops(self) -> GitOps[str]:
+        with profiler.phase("metadata"):
+            result = yield GitCommand(
+                ["git", "log", "--format=%B", "-n", "1", self.hash],
+                cwd=self._repo_path,
+            )
+        return result.stdout.strip()
+
+    def _modified_files_ops(self) -> GitOps[list[ModifiedFile]]:
+        with profiler.phase("metadata"):
+            result = yield GitCommand(
+                [
+                    "git",
+                    "show",
+                    "--numstat",
+                    "--diff-merges=first-parent",
+                    "--format=",
+                    self.hash,
+                ],
+                cwd=self._repo_path,
+            )
+        return parse_numstat(
+            self._repo_path, self.hash, result.stdout.splitlines()
         )
-        files = []
-        for line in result.stdout.splitlines():
-            parts = line.split(maxsplit=2)
-            if len(parts) == 3:
-                add_str, rem_str, filename = parts
-                try:
-                    added = int(add_str)
-                except ValueError:
-                    added = 0
-                try:
-                    removed = int(rem_str)
-                except ValueError:
-                    removed = 0
-                files.append(
-                    ModifiedFile(
-                        self._repo_path, self.hash, filename, added, removed
-                    )
-                )
-        return files
 
     @cached_property
     def added_lines(self) -> int:
@@ -139,10 +550,41 @@ class Commit:
         return sum(f.modified_lines for f in self.modified_files)
 
 
+# Minimum title similarity for two commits to be considered the same change
+TITLE_SIMILARITY_THRESHOLD = 0.50
+
+# Minimum Jaccard similarity of changed lines for content based matching
+CONTENT_SIMILARITY_THRESHOLD = 0.50
+
+# MinHash signatures are split into bands of rows for locality-sensitive
+# hashing. Pairs with Jaccard similarity s become candidates with probability
+# 1 - (1 - s**rows)**bands, which is about 0.5 at s = 0.5 and 0.99 at s = 0.75.
+_MINHASH_BANDS = 16
+_MINHASH_ROWS = 4
+_MINHASH_PRIME = (1 << 61) - 1
+# Fixed seed so signatures are comparable between runs
+_minhash_rng = random.Random(0)
+_MINHASH_COEFFICIENTS = [
+    (_minhash_rng.randrange(1, _MINHASH_PRIME), _minhash_rng.randrange(_MINHASH_PRIME))
+    for _ in range(_MINHASH_BANDS * _MINHASH_ROWS)
+]
+
+_PR_NUMBER_RE = re.compile(r"\s*\(#\d+\)|\s*\(backport #\d+\)")
+
+
+def clean_title(title: str) -> str:
+    """Normalize a commit title for similarity checks.
+
+    Strips PR numbers like (#105) or (backport #104) and lower cases the title.
+    """
+    return _PR_NUMBER_RE.sub("", title.strip()).strip().lower()
+
+
 def commits_are_probably_same(commit1: Commit, commit2: Commit) -> bool:
     """Fuzzy comparison to check if two commits are probably the same change.
 
     Checks if commit messages have string similarity up to a hard coded threshold.
+    Use CommitMatcher to compare many commits at once.
     """
     if commit1.hash == commit2.hash:
         return True
@@ -160,11 +602,209 @@ def commits_are_probably_same(commit1: Commit, commit2: Commit) -> bool:
     if files1 != files2:
         return False
 
-    # Strip PR numbers like (#105) or (backport #104) before similarity check
-    clean1 = re.sub(r"\s*\(#\d+\)|\s*\(backport #\d+\)", "", title1).strip().lower()
-    clean2 = re.sub(r"\s*\(#\d+\)|\s*\(backport #\d+\)", "", title2).strip().lower()
+    clean1 = clean_title(title1)
+    clean2 = clean_title(title2)
+
+    return SequenceMatcher(None, clean1, clean2).ratio() >= TITLE_SIMILARITY_THRESHOLD
+
+
+class CommitMatcher:
+    """Finds pairs of old and new commits that are probably the same change.
+
+    If patch ids are given, commits with identical patch ids are matched
+    exactly first. Those are clean cherry-picks, so they take no part in the
+    fuzzy matching, which gives the same answers as commits_are_probably_same()
+    on every remaining (old, new) pair. Each commit's title and file set are
+    normalized once, and titles are only compared between commits that modify
+    the same set of files. The match table is computed once and shared by all
+    accessors.
+
+    If changed lines are given, commits that were retitled or touch different
+    files can still match by content. Candidate pairs are found with MinHash
+    locality-sensitive hashing and kept if the Jaccard similarity of their
+    changed lines reaches CONTENT_SIMILARITY_THRESHOLD.
+    """
+
+    def __init__(
+        self,
+        old_commits: list[Commit],
+        new_commits: list[Commit],
+        patch_ids: dict[str, str] | None = None,
+        changed_lines: dict[str, list[str]] | None = None,
+    ) -> None:
+        """Create a matcher.
+
+        Args:
+            old_commits (list[Commit]): Commits on the old branch.
+            new_commits (list[Commit]): Commits on the new branch.
+            patch_ids (dict[str, str] | None): Optional patch id by commit hash,
+                as returned by ClonedRepository.patch_ids().
+            changed_lines (dict[str, list[str]] | None): Optional changed lines
+                by commit hash, as returned by ClonedRepository.changed_lines().
+                If given, commits whose changed lines are similar also match.
+        """
+        self.old_commits = old_commits
+        self.new_commits = new_commits
+        self.patch_ids = patch_ids or {}
+        self.changed_lines = changed_lines
+
+    @cached_property
+    def exact_matches(self) -> list[list[Commit]]:
+        """For each new commit, the old commits that introduce an identical patch."""
+        old_by_patch_id = defaultdict(list)
+        for i, commit in enumerate(self.old_commits):
+            patch_id = self.patch_ids.get(commit.hash)
+            if patch_id is not None:
+                old_by_patch_id[patch_id].append(i)
+
+        table = []
+        for commit in self.new_commits:
+            patch_id = self.patch_ids.get(commit.hash)
+            found = old_by_patch_id.get(patch_id, ()) if patch_id else ()
+            table.append([self.old_commits[i] for i in found])
+        return table
+
+    @cached_property
+    def matches(self) -> list[list[Commit]]:
+        """For each new commit, the old commits that are probably the same change."""
+        exactly_matched = {
+            id(old_c) for old_matches in self.exact_matches for old_c in old_matches
+        }
+        old_by_hash = defaultdict(list)
+        # Old commits without a title only match new commits without a title
+        untitled = []
+        # Old commits bucketed by the set of files they modify
+        buckets: dict[frozenset[str], list[tuple[int, str]]] = defaultdict(list)
+        for i, commit in enumerate(self.old_commits):
+            old_by_hash[commit.hash].append(i)
+            if id(commit) in exactly_matched:
+                continue
+            title = commit.first_message_line.strip()
+            if not title:
+                untitled.append(i)
+            else:
+                buckets[_file_set_key(commit)].append((i, clean_title(title)))
+
+        content_matches = self.content_matches
+        table = []
+        seq = SequenceMatcher(None)
+        for j, (commit, exact) in enumerate(zip(self.new_commits, self.exact_matches)):
+            if exact:
+                table.append(exact)
+                continue
+            found = set(old_by_hash.get(commit.hash, ()))
+            title = commit.first_message_line.strip()
+            if not title:
+                found.update(untitled)
+            else:
+                # SequenceMatcher caches information about the second sequence
+                seq.set_seq2(clean_title(title))
+                for i, old_title in buckets.get(_file_set_key(commit), ()):
+                    seq.set_seq1(old_title)
+                    # The quick ratios are cheap upper bounds of ratio()
+                    if (
+                        seq.real_quick_ratio() >= TITLE_SIMILARITY_THRESHOLD
+                        and seq.quick_ratio() >= TITLE_SIMILARITY_THRESHOLD
+                        and seq.ratio() >= TITLE_SIMILARITY_THRESHOLD
+                    ):
+                        found.add(i)
+            found.update(content_matches.get(j, ()))
+            table.append([self.old_commits[i] for i in sorted(found)])
+        return table
+
+    @cached_property
+    def content_matches(self) -> dict[int, set[int]]:
+        """Indices of old commits with similar changed lines, by new commit index.
+
+        Commits with identical patches are settled already and left out.
+        """
+        if self.changed_lines is None:
+            return {}
+        exactly_matched = {
+            id(old_c) for old_matches in self.exact_matches for old_c in old_matches
+        }
+
+        old_shingles = {}
+        buckets: dict[tuple[int, ...], list[int]] = defaultdict(list)
+        for i, commit in enumerate(self.old_commits):
+            if id(commit) in exactly_matched:
+                continue
+            shingles = line_shingles(self.changed_lines.get(commit.hash, ()))
+            if not shingles:
+                continue
+            old_shingles[i] = shingles
+            for key in _lsh_band_keys(minhash_signature(shingles)):
+                buckets[key].append(i)
+
+        table = {}
+        for j, (commit, exact) in enumerate(zip(self.new_commits, self.exact_matches)):
+            if exact:
+                continue
+            shingles = line_shingles(self.changed_lines.get(commit.hash, ()))
+            if not shingles:
+                continue
+            candidates = set()
+            for key in _lsh_band_keys(minhash_signature(shingles)):
+                candidates.update(buckets.get(key, ()))
+            for i in candidates:
+                other = old_shingles[i]
+                similarity = len(shingles & other) / len(shingles | other)
+                if similarity >= CONTENT_SIMILARITY_THRESHOLD:
+                    table.setdefault(j, set()).add(i)
+        return table
+
+    def probably_same(self) -> list[tuple[Commit, Commit]]:
+        """Get (old, new) pairs that are probably the same change, ordered by old commit."""
+        old_index = {id(c): i for i, c in enumerate(self.old_commits)}
+        pairs = [
+            (old_c, new_c)
+            for new_c, old_matches in zip(self.new_commits, self.matches)
+            for old_c in old_matches
+        ]
+        return sorted(pairs, key=lambda pair: old_index[id(pair[0])])
+
+    def probably_new(self) -> list[Commit]:
+        """Get new commits that do not match any old commit."""
+        return [
+            new_c
+            for new_c, old_matches in zip(self.new_commits, self.matches)
+            if not old_matches
+        ]
+
+
+def line_shingles(lines: Iterable[str]) -> frozenset[int]:
+    """Hash changed lines of a patch into a set of shingles for MinHash.
+
+    Lines keep their leading `+` or `-` but other surrounding whitespace is
+    ignored, so re-indented code still matches. Blank lines are dropped.
+    """
+    shingles = set()
+    for line in lines:
+        line = line[:1] + line[1:].strip()
+        if len(line) > 1:
+            digest = hashlib.blake2b(line.encode("utf-8"), digest_size=8).digest()
+            shingles.add(int.from_bytes(digest, "little"))
+    return frozenset(shingles)
+
+
+def minhash_signature(shingles: frozenset[int]) -> tuple[int, ...]:
+    """Compute the MinHash signature of a non-empty set of shingles."""
+    return tuple(
+        min((a * x + b) % _MINHASH_PRIME for x in shingles)
+        for a, b in _MINHASH_COEFFICIENTS
+    )
+
+
+def _lsh_band_keys(signature: tuple[int, ...]) -> Iterator[tuple[int, ...]]:
+    """Yield one bucket key per band of a MinHash signature."""
+    for band in range(_MINHASH_BANDS):
+        start = band * _MINHASH_ROWS
+        yield (band, *signature[start:start + _MINHASH_ROWS])
+
 
-    return SequenceMatcher(None, clean1, clean2).ratio() >= 0.50
+def _file_set_key(commit: Commit) -> frozenset[str]:
+    """Get a hashable key of the set of files a commit modifies."""
+    return frozenset(f.filename for f in commit.modified_files)
 
 
 def is_probably_release_commit(commit: Commit) -> bool:
@@ -180,29 +820,286 @@ def is_probably_release_commit(commit: Commit) -> bool:
     return False
 
 
+class MirrorCache:
+    """Persistent on-disk cache of bare git mirrors keyed by normalized URL.
+
+    Mirrors are only ever updated with the branches that are asked for, and the
+    least recently used mirrors are deleted when the cache grows beyond its
+    disk budget.
+    """
+
+    def __init__(self, cache_dir: str, max_bytes: int) -> None:
+        """Create a mirror cache.
+
+        Args:
+            cache_dir (str): Directory holding the mirrors. Created if missing.
+            max_bytes (int): Disk budget in bytes for all mirrors together.
+        """
+        self.cache_dir = os.path.abspath(cache_dir)
+        self.max_bytes = max_bytes
+        os.makedirs(self.cache_dir, exist_ok=True)
+
+    def path_for(self, url: str) -> str:
+        """Get the path where the bare mirror for a URL is or would be stored.
+
+        Args:
+            url (str): The Git repository URL.
+
+        Returns:
+            str: Path to the bare git repository.
+        """
+        normalized = normalize_git_url(url)
+        digest = hashlib.sha256(normalized.encode("utf-8")).hexdigest()[:12]
+        slug = re.sub(r"[^A-Za-z0-9._-]+", "_", normalized)[-64:]
+        return os.path.join(self.cache_dir, f"{slug}-{digest}")
+
+    def mirror_path(self, url: str, blobless: bool = False) -> str:
+        """Get the path of the bare mirror for a URL, creating it if needed.
+
+        Using a mirror marks it as recently used.
+
+        Args:
+            url (str): The Git repository URL.
+            blobless (bool): Create a new mirror as a partial clone that
+                downloads file contents only when they are needed.
+
+        Returns:
+            str: Path to the bare git repository.
+        """
+        return run_git_ops(self.mirror_path_ops(url, blobless))
+
+    def mirror_path_ops(self, url: str, blobless: bool) -> GitOps[str]:
+        """Like mirror_path() as a generator of GitCommands for run_git_ops_async()."""
+        with profiler.phase("clone"):
+            path = self.path_for(url)
+            if not os.path.isdir(path):
+                yield GitCommand(["git", "init", "--quiet", "--bare", path])
+                if blobless:
+                    yield from _configure_promisor_remote_ops(path)
+            yield GitCommand(["git", "config", "remote.origin.url", url], cwd=path)
+            os.utime(path)
+        return path
+
+    @profiler.phase("evict")
+    def evict(self, keep: Iterable[str] = ()) -> None:
+        """Delete least recently used mirrors until the cache fits its disk budget.
+
+        Args:
+            keep (Iterable[str]): Mirror paths that must not be deleted, such as
+                mirrors that are still in use.
+        """
+        keep = {os.path.abspath(k) for k in keep}
+        mirrors = []
+        total = 0
+        for entry in os.scandir(self.cache_dir):
+            if not entry.is_dir(follow_symlinks=False):
+                continue
+            size = _directory_size(entry.path)
+            total += size
+            mirrors.append((entry.stat().st_mtime, entry.path, size))
+
+        for _, path, size in sorted(mirrors):
+            if total <= self.max_bytes:
+                break
+            if path in keep:
+                continue
+            print(f"Evicting cached mirror {path}")
+            shutil.rmtree(path, ignore_errors=True)
+            total -= size
+
+
+def _configure_promisor_remote_ops(path: str) -> GitOps[None]:
+    """Configure the origin remote of a repository as a blobless partial clone remote."""
+    for key, value in (
+        ("core.repositoryformatversion", "1"),
+        ("extensions.partialClone", "origin"),
+        ("remote.origin.promisor", "true"),
+        ("remote.origin.partialclonefilter", "blob:none"),
+    ):
+        yield GitCommand(["git", "config", key, value], cwd=path)
+
+
+def _directory_size(path: str) -> int:
+    """Get the total size in bytes of all files below a directory."""
+    total = 0
+    for dirpath, _, filenames in os.walk(path):
+        for filename in filenames:
+            try:
+                total += os.lstat(os.path.join(dirpath, filename)).st_size
+            except OSError:
+                pass
+    return total
+
+
+class _CommitLogParser:
+    """Parse the `git log` records of ClonedRepository.iterate_commits() line by line.
+
+    Each record is: RS hash US message US, followed by numstat lines.
+    """
+
+    def __init__(self, repo_path: str) -> None:
+        self._repo_path = repo_path
+        self._commits: list[Commit] = []
+        self._hash: str | None = None
+        self._message_lines: list[str] = []
+        self._numstat_lines: list[str] = []
+        self._in_message = False
+
+    def _finish_commit(self) -> None:
+        if self._hash is not None:
+            self._commits.append(
+                Commit(
+                    self._repo_path,
+                    self._hash,
+                    message="".join(self._message_lines).strip(),
+                    modified_files=parse_numstat(
+                        self._repo_path, self._hash, self._numstat_lines
+                    ),
+                )
+            )
+
+    def feed(self, line: str) -> None:
+        """Parse the next line of output."""
+        if line.startswith(_RECORD_SEP):
+            self._finish_commit()
+            self._hash, _, line = line[1:].partition(_FIELD_SEP)
+            self._message_lines = []
+            self._numstat_lines = []
+            self._in_message = True
+        if self._in_message:
+            message, sep, _ = line.partition(_FIELD_SEP)
+            self._message_lines.append(message)
+            if sep:
+                self._in_message = False
+        else:
+            self._numstat_lines.append(line.rstrip("\n"))
+
+    def close(self) -> list[Commit]:
+        """Finish the last record and return all commits."""
+        self._finish_commit()
+        self._hash = None
+        return self._commits
+
+
 class ClonedRepository:
-    """Manages a temporary clone of a git repository.
+    """Manages a clone of a git repository.
+
+    Without a cache the clone is stored in a temporary directory that is
+    cleaned up when the instance is garbage collected. With a MirrorCache the
+    repository is a persistent bare mirror that is updated incrementally.
 
-    The clone is stored in a temporary directory that is cleaned up when the
-    instance is garbage collected.
+    A blobless clone is a bare partial clone of only the branches that are
+    compared. It downloads commits and trees, but file contents are only
+    downloaded by prefetch_blobs() or when a ModifiedFile.patch is read.
+
+    Every public method that runs git has an `_ops` counterpart, a generator of
+    GitCommands that run_git_ops_async() runs as asyncio subprocesses, limited
+    by set_git_process_limit(). Use create_ops() instead of the constructor to
+    clone without blocking the event loop.
     """
 
-    def __init__(self, url: str, branch: str) -> None:
-        """Clone a git repository into a temporary directory.
+    def __init__(
+        self,
+        url: str,
+        branch: str,
+        cache: MirrorCache | None = None,
+        blobless: bool = False,
+    ) -> None:
+        """Clone a git repository into a temporary directory or cached mirror.
 
         Args:
             url (str): The Git repository URL.
             branch (str): The branch to clone.
+            cache (MirrorCache | None): Optional cache of persistent mirrors.
+            blobless (bool): Make a partial clone without file contents.
         """
+        self._setup(url, branch, cache, blobless)
+        run_git_ops(self._clone_ops())
+
+    @classmethod
+    def create_ops(
+        cls,
+        url: str,
+        branch: str,
+        cache: MirrorCache | None,
+        blobless: bool,
+    ) -> GitOps["ClonedRepository"]:
+        """Like the constructor, as a generator of GitCommands for run_git_ops_async()."""
+        self = cls.__new__(cls)
+        self._setup(url, branch, cache, blobless)
+        yield from self._clone_ops()
+        return self
+
+    def _setup(
+        self,
+        url: str,
+        branch: str,
+        cache: MirrorCache | None,
+        blobless: bool,
+    ) -> None:
         self.url = url
         self.branch = branch
-        self._temp_dir = tempfile.TemporaryDirectory()
-        self.path = self._temp_dir.name
+        self.blobless = blobless
+        self._cache = cache
+        self._fetched: set[str] = set()
+        if cache is None:
+            self._temp_dir = tempfile.TemporaryDirectory()
+            self.path = self._temp_dir.name
+
+    def _clone_ops(self) -> GitOps[None]:
+        with profiler.phase("clone"):
+            if self._cache is not None:
+                self.path = yield from self._cache.mirror_path_ops(
+                    self.url, self.blobless
+                )
+                yield from self._fetch_branch_ops(self.branch)
+                return
+
+            if self.blobless:
+                yield GitCommand(
+                    [
+                        "git",
+                        "clone",
+                        "--bare",
+                        "--filter=blob:none",
+                        "--single-branch",
+                        "--no-tags",
+                        "--branch",
+                        self.branch,
+                        self.url,
+                        self.path,
+                    ],
+                    capture_output=False,
+                )
+                self._fetched.add(self.branch)
+                return
 
-        subprocess.run(
-            ["git", "clone", "--branch", branch, url, self.path],
-            check=True,
-        )
+            yield GitCommand(
+                ["git", "clone", "--branch", self.branch, self.url, self.path],
+                capture_output=False,
+            )
+
+    @property
+    def _is_bare(self) -> bool:
+        return self._cache is not None or self.blobless
+
+    def _fetch_branch_ops(self, branch: str) -> GitOps[None]:
+        """Incrementally fetch a single branch into a bare repository."""
+        if branch in self._fetched:
+            return
+        with profiler.phase("fetch"):
+            yield GitCommand(
+                [
+                    "git",
+                    "fetch",
+                    "--no-tags",
+                    "origin",
+                    f"+refs/heads/{branch}:refs/heads/{branch}",
+                ],
+                cwd=self.path,
+                capture_output=False,
+            )
+        self._fetched.add(branch)
 
     def find_common_ancestor(self, branch1: str, branch2: str) -> str:
         """Find the commit hash of the common ancestor between two branches.
@@ -214,22 +1111,66 @@ class ClonedRepository:
         Returns:
             str: The commit hash of the common ancestor.
         """
-        for b in (branch1, branch2):
-            subprocess.run(
-                ["git", "fetch", "origin", f"{b}:{b}"],
-                cwd=self.path,
-                capture_output=True,
+        return run_git_ops(self.find_common_ancestor_ops(branch1, branch2))
+
+    def find_common_ancestor_ops(self, branch1: str, branch2: str) -> GitOps[str]:
+        """Like find_common_ancestor() as a generator of GitCommands for run_git_ops_async()."""
+        with profiler.phase("merge-base"):
+            for b in (branch1, branch2):
+                if self._is_bare:
+                    yield from self._fetch_branch_ops(b)
+                    continue
+                with profiler.phase("fetch"):
+                    yield GitCommand(
+                        ["git", "fetch", "origin", f"{b}:{b}"],
+                        cwd=self.path,
+                        check=False,
+                    )
+
+            result = yield GitCommand(
+                ["git", "merge-base", branch1, branch2], cwd=self.path
             )
+        return result.stdout.strip()
 
-        result = subprocess.run(
-            ["git", "merge-base", branch1, branch2],
-            cwd=self.path,
-            capture_output=True,
-            text=True,
-            check=True,
-        )
+    def find_common_ancestor_of(self, commits: list[str]) -> str:
+        """Find the commit hash of the best common ancestor of several commits.
+
+        Args:
+            commits (list[str]): Commit hashes or branch names.
+
+        Returns:
+            str: The commit hash of the common ancestor.
+        """
+        return run_git_ops(self.find_common_ancestor_of_ops(commits))
+
+    def find_common_ancestor_of_ops(self, commits: list[str]) -> GitOps[str]:
+        """Like find_common_ancestor_of() as a generator of GitCommands for run_git_ops_async()."""
+        with profiler.phase("merge-base"):
+            result = yield GitCommand(
+                ["git", "merge-base", "--octopus", *commits], cwd=self.path
+            )
         return result.stdout.strip()
 
+    def commit_hashes(self, from_commit: str, to_branch: str) -> set[str]:
+        """Get the hashes of commits from from_commit (exclusive) to to_branch (inclusive).
+
+        Args:
+            from_commit (str): The starting commit hash.
+            to_branch (str): The ending branch name.
+
+        Returns:
+            set[str]: The commit hashes.
+        """
+        return run_git_ops(self.commit_hashes_ops(from_commit, to_branch))
+
+    def commit_hashes_ops(self, from_commit: str, to_branch: str) -> GitOps[set[str]]:
+        """Like commit_hashes() as a generator of GitCommands for run_git_ops_async()."""
+        with profiler.phase("rev-list"):
+            result = yield GitCommand(
+                ["git", "rev-list", f"{from_commit}..{to_branch}"], cwd=self.path
+            )
+        return set(result.stdout.split())
+
     def iterate_commits(
         self, from_commit: str, to_branch: str
     ) -> Iterator[Commit]:
@@ -245,27 +1186,244 @@ class ClonedRepository:
         Raises:
             ValueError: If from_commit is not an ancestor of to_branch.
         """
-        try:
-            subprocess.run(
+        yield from run_git_ops(self.commits_ops(from_commit, to_branch))
+
+    def commits_ops(self, from_commit: str, to_branch: str) -> GitOps[list[Commit]]:
+        """Like iterate_commits(), but returning a list, as a generator of GitCommands for run_git_ops_async()."""
+        with profiler.phase("commits"):
+            result = yield GitCommand(
                 ["git", "merge-base", "--is-ancestor", from_commit, to_branch],
                 cwd=self.path,
-                check=True,
+                check=False,
             )
-        except subprocess.CalledProcessError:
-            raise ValueError(
-                f"Commit {from_commit} is not an ancestor of {to_branch}"
+            if result.returncode:
+                raise ValueError(
+                    f"Commit {from_commit} is not an ancestor of {to_branch}"
+                )
+
+            # One `git log` reads hash, message and numstat for every commit
+            # instead of spawning several processes per commit.
+            # Each record is: RS hash US message US, followed by numstat lines.
+            # Merges are diffed against their first parent like `git show` does,
+            # otherwise `git log` prints no numstat for them at all.
+            parser = _CommitLogParser(self.path)
+            yield GitCommand(
+                [
+                    "git",
+                    "log",
+                    "--reverse",
+                    "--numstat",
+                    "--diff-merges=first-parent",
+                    f"--format={_RECORD_SEP}%H{_FIELD_SEP}%B{_FIELD_SEP}",
+                    f"{from_commit}..{to_branch}",
+                ],
+                cwd=self.path,
+                on_line=parser.feed,
             )
+            return parser.close()
 
-        result = subprocess.run(
-            ["git", "rev-list", "--reverse", f"{from_commit}..{to_branch}"],
-            cwd=self.path,
-            capture_output=True,
-            text=True,
-            check=True,
-        )
+    def prefetch_blobs(self, from_commit: str, branches: Iterable[str]) -> None:
+        """Download the file contents modified after from_commit in one batch.
+
+        Numstat and patch ids need the contents of every modified file. A
+        partial clone would otherwise download them lazily, one request per
+        commit. Only partial clones are searched for missing contents, and
+        nothing is downloaded if they already have all of them.
+
+        Args:
+            from_commit (str): The starting commit hash (exclusive).
+            branches (Iterable[str]): The ending branch names (inclusive).
+        """
+        run_git_ops(self.prefetch_blobs_ops(from_commit, branches))
+
+    def prefetch_blobs_ops(
+        self, from_commit: str, branches: Iterable[str]
+    ) -> GitOps[None]:
+        """Like prefetch_blobs() as a generator of GitCommands for run_git_ops_async()."""
+        if not self._is_bare:
+            return
+        branches = list(branches)
+        with profiler.phase("prefetch"):
+            # Mirrors with all file contents have nothing to fetch. Mirrors
+            # cloned by an earlier --blobless run are still partial clones.
+            result = yield GitCommand(
+                [
+                    "git",
+                    "config",
+                    "--get-regexp",
+                    r"^(extensions\.partialclone|remote\.origin\.promisor)$",
+                ],
+                cwd=self.path,
+                check=False,
+            )
+            partial = False
+            for line in result.stdout.splitlines():
+                key, _, value = line.partition(" ")
+                if key == "extensions.partialclone" or value.lower() == "true":
+                    partial = True
+            if not partial:
+                return
+
+            # Raw diffs only compare trees, so they never download file contents
+            result = yield GitCommand(
+                [
+                    "git",
+                    "log",
+                    "--raw",
+                    "--diff-merges=first-parent",
+                    "--no-abbrev",
+                    "--no-renames",
+                    "--format=",
+                    *branches,
+                    f"^{from_commit}",
+                ],
+                cwd=self.path,
+            )
+            modified = set()
+            for line in result.stdout.splitlines():
+                parts = line.split(maxsplit=4)
+                if len(parts) == 5 and line.startswith(":"):
+                    modified.update(parts[2:4])
+            modified.discard("0" * 40)
+
+            # Contents that changed after from_commit, and the contents at
+            # from_commit itself that were modified later on.
+            missing = set()
+            for revisions in (
+                [*branches, f"^{from_commit}"],
+                [f"{from_commit}^{{tree}}"],
+            ):
+                result = yield GitCommand(
+                    ["git", "rev-list", "--objects", "--missing=print", *revisions],
+                    cwd=self.path,
+                )
+                for line in result.stdout.splitlines():
+                    if line.startswith("?"):
+                        missing.add(line[1:].strip())
+            missing &= modified
+            if not missing:
+                return
+
+            # This is how git itself fetches missing objects from a promisor remote
+            yield GitCommand(
+                [
+                    "git",
+                    "-c",
+                    "fetch.negotiationAlgorithm=noop",
+                    "fetch",
+                    "--no-tags",
+                    "--no-write-fetch-head",
+                    "--recurse-submodules=no",
+                    "--filter=blob:none",
+                    "--stdin",
+                    "origin",
+                ],
+                cwd=self.path,
+                input="\n".join(sorted(missing)) + "\n",
+                capture_output=False,
+            )
+
+    def changed_lines(self, from_commit: str, branches: Iterable[str]) -> dict[str, list[str]]:
+        """Get the added and removed lines of all commits after from_commit on the given branches.
+
+        Args:
+            from_commit (str): The starting commit hash (exclusive).
+            branches (Iterable[str]): The ending branch names (inclusive).
+
+        Returns:
+            dict[str, list[str]]: Changed lines, including their leading `+` or
+            `-`, by commit hash.
+        """
+        return run_git_ops(self.changed_lines_ops(from_commit, branches))
+
+    def changed_lines_ops(
+        self, from_commit: str, branches: Iterable[str]
+    ) -> GitOps[dict[str, list[str]]]:
+        """Like changed_lines() as a generator of GitCommands for run_git_ops_async()."""
+        with profiler.phase("changed-lines"):
+            changed: dict[str, list[str]] = {}
+            lines: list[str] = []
+            in_header = False
+
+            # The patches of every commit can be huge, so only the changed
+            # lines are kept as they stream in
+            def on_line(line: str) -> None:
+                nonlocal lines, in_header
+                if line.startswith(_RECORD_SEP):
+                    lines = changed.setdefault(line[1:].strip(), [])
+                elif line.startswith("diff --git "):
+                    in_header = True
+                elif line.startswith("@@"):
+                    in_header = False
+                elif not in_header and line[:1] in ("+", "-"):
+                    lines.append(line.rstrip("\n"))
+
+            yield GitCommand(
+                [
+                    "git",
+                    "log",
+                    "-p",
+                    "-U0",
+                    "--diff-merges=first-parent",
+                    "--no-color",
+                    "--no-ext-diff",
+                    f"--format={_RECORD_SEP}%H",
+                    *branches,
+                    f"^{from_commit}",
+                ],
+                cwd=self.path,
+                errors="replace",
+                on_line=on_line,
+            )
+            return changed
+
+    def patch_ids(self, from_commit: str, branches: Iterable[str]) -> dict[str, str]:
+        """Compute stable patch ids of all commits after from_commit on the given branches.
+
+        All commits are piped through a single `git patch-id --stable`. Commits
+        with identical patch ids introduce the same change, so clean
+        cherry-picks and backports can be matched by a dictionary lookup.
+
+        Args:
+            from_commit (str): The starting commit hash (exclusive).
+            branches (Iterable[str]): The ending branch names (inclusive).
+
+        Returns:
+            dict[str, str]: Patch id by commit hash. Merges are diffed against
+            their first parent. Commits without a diff are missing.
+        """
+        return run_git_ops(self.patch_ids_ops(from_commit, branches))
+
+    def patch_ids_ops(
+        self, from_commit: str, branches: Iterable[str]
+    ) -> GitOps[dict[str, str]]:
+        """Like patch_ids() as a generator of GitCommands for run_git_ops_async()."""
+        with profiler.phase("patch-id"):
+            log = GitCommand(
+                [
+                    "git",
+                    "log",
+                    "-p",
+                    "--diff-merges=first-parent",
+                    "--no-color",
+                    "--no-ext-diff",
+                    "--format=commit %H",
+                    *branches,
+                    f"^{from_commit}",
+                ],
+                cwd=self.path,
+            )
+            result = yield GitCommand(
+                ["git", "patch-id", "--stable"], cwd=self.path, stdin_from=log
+            )
+
+        patch_ids = {}
         for line in result.stdout.splitlines():
-            if line.strip():
-                yield Commit(self.path, line.strip())
+            parts = line.split()
+            if len(parts) == 2:
+                patch_id, commit_hash = parts
+                patch_ids[commit_hash] = patch_id
+        return patch_ids
 
 
 def parse_repos_file(file_path: str) -> list[Repository]:
@@ -301,7 +1459,7 @@ def parse_arguments() -> argparse.Namespace:
 
     Returns:
         argparse.Namespace: The parsed arguments containing `new_rosdistro` and
-        `old_rosdistro`.
+        `old_rosdistro`, a dict of old repos file paths by distribution label.
     """
     parser = argparse.ArgumentParser(
         description="Create a CSV file showing new commits in a ROS distribution since a previous rosdistro."
@@ -314,14 +1472,86 @@ def parse_arguments() -> argparse.Namespace:
     parser.add_argument(
         "--old-rosdistro",
         required=True,
-        help="Path to the repository YAML file for the old ROS distribution.",
+        nargs="+",
+        metavar="[LABEL=]PATH",
+        help="Paths to the repository YAML files for one or more old ROS "
+        "distributions. Each gets a CSV column named after LABEL, which "
+        "defaults to the file name without its extension.",
     )
     parser.add_argument(
         "--output",
         required=True,
         help="Path to the output CSV file.",
     )
-    return parser.parse_args()
+    parser.add_argument(
+        "--blobless",
+        action="store_true",
+        help="Make partial clones of only the two compared branches, downloading "
+        "file contents only for commits made after their common ancestor.",
+    )
+    parser.add_argument(
+        "--content-matching",
+        action="store_true",
+        help="Also treat commits as the same change if their added and removed "
+        "lines are similar, even if their titles or modified files differ.",
+    )
+    parser.add_argument(
+        "--profile",
+        action="store_true",
+        help="Write wall time and subprocess counts per phase and per repository "
+        "as JSON to the output path with a .profile.json suffix.",
+    )
+    parser.add_argument(
+        "--resume",
+        action="store_true",
+        help="Record completed repositories in a state file, and skip the ones "
+        "completed by a previous interrupted run with the same repos files. The "
+        "state file is removed once the run completes.",
+    )
+    parser.add_argument(
+        "--state-file",
+        help="Path to the file recording completed repositories, written only "
+        "with --resume or this option (default: the output path with a .state suffix).",
+    )
+    parser.add_argument(
+        "--jobs",
+        "-j",
+        type=int,
+        default=1,
+        help="Number of repositories to compare concurrently (default: %(default)s).",
+    )
+    parser.add_argument(
+        "--git-processes",
+        type=int,
+        default=os.cpu_count() or 1,
+        help="Maximum number of git processes to run at once across all "
+        "repositories (default: %(default)s).",
+    )
+    parser.add_argument(
+        "--cache-dir",
+        help="Directory for persistent bare mirrors of repositories. "
+        "Repositories are cloned into temporary directories if not given.",
+    )
+    parser.add_argument(
+        "--cache-max-gb",
+        type=float,
+        default=20.0,
+        help="Disk budget for --cache-dir in gigabytes. Least recently used "
+        "mirrors are evicted once it is exceeded (default: %(default)s).",
+    )
+    args = parser.parse_args()
+
+    old_rosdistros = {}
+    for value in args.old_rosdistro:
+        label, sep, path = value.partition("=")
+        if not sep:
+            path = value
+            label = os.path.splitext(os.path.basename(value))[0]
+        if label in old_rosdistros:
+            parser.error(f"Duplicate old distribution label '{label}', use LABEL=PATH")
+        old_rosdistros[label] = path
+    args.old_rosdistro = old_rosdistros
+    return args
 
 
 def find_matching_repo(
@@ -342,54 +1572,327 @@ def find_matching_repo(
     return None
 
 
-def main() -> None:
-    """Main entry point for the script."""
-    args = parse_arguments()
-    old_repos = parse_repos_file(args.old_rosdistro)
-    new_repos = parse_repos_file(args.new_rosdistro)
+def compare_repository(
+    new_repo: Repository,
+    old_repos: dict[str, Repository | None],
+    cache: MirrorCache | None = None,
+    blobless: bool = False,
+    content_matching: bool = False,
+) -> tuple[str, list[list[str]]]:
+    """Find commits on a repository's new branch that are probably not on its old branches.
 
-    with open(args.output, mode="w", newline="", encoding="utf-8") as csv_file:
-        csv_writer = csv.writer(csv_file)
-        csv_writer.writerow(["name", "url", "commit_hash", "first_message_line"])
+    The repository is cloned and its new commits are read once, then matched
+    against the commits of every old distribution's branch.
 
-        for new_repo in new_repos:
-            matching_old = find_matching_repo(new_repo, old_repos)
-            if matching_old:
-                print(f"\nFound match for {new_repo.name}")
+    Progress is written to a report rather than stdout so that repositories can
+    be compared concurrently without interleaving their output.
+
+    Args:
+        new_repo (Repository): The repository in the new ROS distribution.
+        old_repos (dict[str, Repository | None]): The matching repository in
+            each old ROS distribution by distribution label, or None if the
+            distribution does not have the repository.
+        cache (MirrorCache | None): Optional cache of persistent mirrors.
+        blobless (bool): Make a partial clone without file contents.
+        content_matching (bool): Also match commits with similar changed lines.
+
+    Returns:
+        tuple[str, list[list[str]]]: The human readable report and the CSV rows
+        of commits that are probably new since at least one old distribution.
+    """
+    return run_git_ops(
+        _compare_repository_ops(new_repo, old_repos, cache, blobless, content_matching)
+    )
+
+
+def _compare_repository_ops(
+    new_repo: Repository,
+    old_repos: dict[str, Repository | None],
+    cache: MirrorCache | None,
+    blobless: bool,
+    content_matching: bool,
+) -> GitOps[tuple[str, list[list[str]]]]:
+    report = io.StringIO()
+    matched = {label: r for label, r in old_repos.items() if r is not None}
+
+    print(f"Cloning {new_repo.url} @ {new_repo.branch}", file=report)
+    cloned_repo = yield from ClonedRepository.create_ops(new_repo.url, new_repo.branch, cache, blobless)
+
+    bases = {}
+    for label, old_repo in matched.items():
+        bases[label] = yield from cloned_repo.find_common_ancestor_ops(new_repo.branch, old_repo.branch)
+        print(f"Found common ancestor between {new_repo.branch} and {old_repo.branch} ({label}): {bases[label]}", file=report)
+    # New commits since the oldest branch point include those since every other one
+    root_base = yield from cloned_repo.find_common_ancestor_of_ops(list(bases.values()))
+    branches = [new_repo.branch, *(r.branch for r in matched.values())]
+    yield from cloned_repo.prefetch_blobs_ops(root_base, branches)
+
+    all_new_commits = [c for c in (yield from cloned_repo.commits_ops(root_base, new_repo.branch)) if not is_probably_release_commit(c)]
+    print(f"Found {len(all_new_commits)} new commits to search", file=report)
+
+    print("\n--- New Commits ---", file=report)
+    for commit in all_new_commits:
+        print(f"[{commit.hash[:7]}] {commit.first_message_line} (files: {len(commit.modified_files)}, +{commit.added_lines}/-{commit.removed_lines})", file=report)
+
+    patch_ids = yield from cloned_repo.patch_ids_ops(root_base, branches)
+    changed_lines = None
+    if content_matching:
+        changed_lines = yield from cloned_repo.changed_lines_ops(root_base, branches)
+
+    probably_new: dict[str, set[str]] = {}
+    for label, old_repo in matched.items():
+        print(f"\n=== Compared with {label} ({old_repo.branch}) ===", file=report)
+        new_commits = all_new_commits
+        if bases[label] != root_base:
+            in_range = yield from cloned_repo.commit_hashes_ops(bases[label], new_repo.branch)
+            new_commits = [c for c in all_new_commits if c.hash in in_range]
+        old_commits = [c for c in (yield from cloned_repo.commits_ops(bases[label], old_repo.branch)) if not is_probably_release_commit(c)]
+        print(f"Found {len(old_commits)} old and {len(new_commits)} new commits to search", file=report)
+
+        print("\n--- Old Commits ---", file=report)
+        for commit in old_commits:
+            print(f"[{commit.hash[:7]}] {commit.first_message_line} (files: {len(commit.modified_files)}, +{commit.added_lines}/-{commit.removed_lines})", file=report)
+
+        with profiler.phase("matching"):
+            matcher = CommitMatcher(old_commits, new_commits, patch_ids, changed_lines)
+            same_commits = matcher.probably_same()
+            new_since_old = matcher.probably_new()
+        num_exact = sum(1 for exact in matcher.exact_matches if exact)
+        print(f"Found {num_exact} new commits with identical patches on the old branch", file=report)
+        if content_matching:
+            print(f"Found {len(matcher.content_matches)} new commits with similar changes on the old branch", file=report)
+
+        print("\n--- Probably Same Commits ---", file=report)
+        for old_c, new_c in same_commits:
+            print(f"Old [{old_c.hash[:7]}] '{old_c.first_message_line}' <==> New [{new_c.hash[:7]}] '{new_c.first_message_line}'", file=report)
+
+        print("\n--- Probably New Commits ---", file=report)
+        for new_c in new_since_old:
+            print(f"[{new_c.hash[:7]}] {new_c.first_message_line} (files: {len(new_c.modified_files)}, +{new_c.added_lines}/-{new_c.removed_lines})", file=report)
+        probably_new[label] = {c.hash for c in new_since_old}
+
+    rows = []
+    for commit in all_new_commits:
+        flags = []
+        for label in old_repos:
+            if label not in probably_new:
+                flags.append("")
             else:
-                print(f"\nNo match found for {new_repo.name}, skipping")
+                flags.append("TRUE" if commit.hash in probably_new[label] else "FALSE")
+        if "TRUE" in flags:
+            rows.append([new_repo.name, new_repo.url, commit.hash, commit.first_message_line, *flags])
+
+    return report.getvalue(), rows
+
+
+async def compare_repository_async(
+    new_repo: Repository,
+    old_repos: dict[str, Repository | None],
+    cache: MirrorCache | None = None,
+    blobless: bool = False,
+    content_matching: bool = False,
+) -> tuple[str, list[list[str]]]:
+    """Like compare_repository(), but run git as asyncio subprocesses."""
+    return await run_git_ops_async(
+        _compare_repository_ops(new_repo, old_repos, cache, blobless, content_matching)
+    )
+
+
+async def _compare_repository_profiled(
+    new_repo: Repository, *args, **kwargs
+) -> tuple[str, list[list[str]]]:
+    """Call compare_repository_async(), attributing the work to the repository in the profile."""
+    with profiler.repository(new_repo.name):
+        return await compare_repository_async(new_repo, *args, **kwargs)
+
+
+class Checkpoint:
+    """Sidecar state file recording which repositories a run has completed.
+
+    The file is JSON lines: a header identifying the repos files followed by
+    one line per completed repository with its CSV rows. Lines are appended
+    and flushed as repositories complete, so an interrupted run can be resumed
+    without comparing the completed repositories again. A run that completes
+    removes the file.
+    """
+
+    def __init__(self, path: str, repos_files: Iterable[str], resume: bool) -> None:
+        """Open a state file, starting a new one unless resuming.
+
+        Args:
+            path (str): Path to the state file.
+            repos_files (Iterable[str]): Paths to the repos files being compared.
+            resume (bool): Load completed repositories from an existing state file.
+
+        Raises:
+            ValueError: If resuming from a state file written for different
+                repos files.
+        """
+        self.path = path
+        self.repos_hash = hash_files(repos_files)
+        self.completed: dict[str, list[list[str]]] = {}
+
+        if resume and os.path.exists(path):
+            self._load()
+        # Rewrite the file to drop any incomplete line left by a killed run.
+        # Replace it atomically so the state survives being killed again.
+        self._file = open(f"{path}.tmp", mode="w", encoding="utf-8")
+        self._write({"repos_hash": self.repos_hash})
+        for name, rows in self.completed.items():
+            self._write({"name": name, "rows": rows})
+        self._file.close()
+        os.replace(f"{path}.tmp", path)
+        self._file = open(path, mode="a", encoding="utf-8")
+
+    def _load(self) -> None:
+        with open(self.path, "r", encoding="utf-8") as f:
+            lines = f.readlines()
+        header = json.loads(lines[0]) if lines else {}
+        if header.get("repos_hash") != self.repos_hash:
+            raise ValueError(
+                f"State file {self.path} was written for different repos files"
+            )
+        for line in lines[1:]:
+            try:
+                entry = json.loads(line)
+            except json.JSONDecodeError:
+                # The last line may be incomplete if the run was killed mid write
                 continue
-            print(f"Cloning {new_repo.url} @ {new_repo.branch}")
-            cloned_repo = ClonedRepository(url=new_repo.url, branch=new_repo.branch)
-
-            base_commit = cloned_repo.find_common_ancestor(new_repo.branch, matching_old.branch)
-            print(f"Found common ancestor between {new_repo.branch} and {matching_old.branch}: {base_commit}")
-            old_commits = [c for c in cloned_repo.iterate_commits(from_commit=base_commit, to_branch=matching_old.branch) if not is_probably_release_commit(c)]
-            new_commits = [c for c in cloned_repo.iterate_commits(from_commit=base_commit, to_branch=new_repo.branch) if not is_probably_release_commit(c)]
-            print(f"Found {len(old_commits)} old and {len(new_commits)} new commits to search")
-
-            print("\n--- Old Commits ---")
-            for commit in old_commits:
-                print(f"[{commit.hash[:7]}] {commit.first_message_line} (files: {len(commit.modified_files)}, +{commit.added_lines}/-{commit.removed_lines})")
-
-            print("\n--- New Commits ---")
-            for commit in new_commits:
-                print(f"[{commit.hash[:7]}] {commit.first_message_line} (files: {len(commit.modified_files)}, +{commit.added_lines}/-{commit.removed_lines})")
-
-            print("\n--- Probably Same Commits ---")
-            for old_c in old_commits:
-                for new_c in new_commits:
-                    if commits_are_probably_same(old_c, new_c):
-                        print(f"Old [{old_c.hash[:7]}] '{old_c.first_message_line}' <==> New [{new_c.hash[:7]}] '{new_c.first_message_line}'")
-
-            print("\n--- Probably New Commits ---")
-            for new_c in new_commits:
-                if not any(commits_are_probably_same(old_c, new_c) for old_c in old_commits):
-                    print(f"[{new_c.hash[:7]}] {new_c.first_message_line} (files: {len(new_c.modified_files)}, +{new_c.added_lines}/-{new_c.removed_lines})")
-                    csv_writer.writerow([new_repo.name, new_repo.url, new_c.hash, new_c.first_message_line])
-            # Stuff happens. Flush after every repo to save progress.
-            csv_file.flush()
+            self.completed[entry["name"]] = entry["rows"]
+
+    def _write(self, entry: dict) -> None:
+        self._file.write(json.dumps(entry) + "\n")
+        self._file.flush()
+
+    def record(self, name: str, rows: list[list[str]]) -> None:
+        """Record that a repository has been compared.
+
+        Args:
+            name (str): The repository name.
+            rows (list[list[str]]): The CSV rows written for the repository.
+        """
+        self.completed[name] = rows
+        self._write({"name": name, "rows": rows})
+
+    def close(self) -> None:
+        self._file.close()
+
+    def remove(self) -> None:
+        """Close and delete the state file once every repository has been compared."""
+        self.close()
+        os.remove(self.path)
+
+
+def hash_files(paths: Iterable[str]) -> str:
+    """Get a SHA-256 hex digest of the contents of files, in order."""
+    digest = hashlib.sha256()
+    for path in paths:
+        with open(path, "rb") as f:
+            digest.update(hashlib.sha256(f.read()).digest())
+    return digest.hexdigest()
+
+
+async def write_comparisons(
+    args: argparse.Namespace,
+    new_repos: list[Repository],
+    old_repos: dict[str, list[Repository]],
+    cache: MirrorCache | None,
+    checkpoint: Checkpoint | None,
+) -> None:
+    """Compare up to args.jobs repositories at once and write the CSV output."""
+    jobs = asyncio.Semaphore(args.jobs)
+    completed = checkpoint.completed if checkpoint is not None else {}
+
+    async def compare(new_repo, matching_old):
+        async with jobs:
+            return await _compare_repository_profiled(new_repo, matching_old, cache, args.blobless, args.content_matching)
+
+    pending = []
+    try:
+        # Start every repository up front, but consume results in repos file
+        # order so the CSV is the same no matter how many jobs are used.
+        for new_repo in new_repos:
+            matching_old = {
+                label: find_matching_repo(new_repo, repos)
+                for label, repos in old_repos.items()
+            }
+            if not any(matching_old.values()):
+                matching_old = None
+            task = None
+            if matching_old and new_repo.name not in completed:
+                task = asyncio.create_task(compare(new_repo, matching_old))
+            pending.append((new_repo, matching_old, task))
+
+        with open(args.output, mode="w", newline="", encoding="utf-8") as csv_file:
+            csv_writer = csv.writer(csv_file)
+            csv_writer.writerow(
+                ["name", "url", "commit_hash", "first_message_line"]
+                + [f"new_since_{label}" for label in old_repos]
+            )
+
+            for index, (new_repo, matching_old, task) in enumerate(pending):
+                if matching_old is None:
+                    print(f"\nNo match found for {new_repo.name}, skipping")
+                    continue
+                if task is None:
+                    print(f"\nAlready compared {new_repo.name} in a previous run, skipping")
+                    csv_writer.writerows(completed[new_repo.name])
+                    continue
+                print(f"\nFound match for {new_repo.name}")
+                report, rows = await task
+                print(report, end="")
+                csv_writer.writerows(rows)
+                # Stuff happens. Flush after every repo to save progress.
+                csv_file.flush()
+                if checkpoint is not None:
+                    checkpoint.record(new_repo.name, rows)
+                if cache is not None:
+                    in_use = [cache.path_for(r.url) for r, _, t in pending[index:] if t is not None]
+                    cache.evict(keep=in_use)
+    finally:
+        # Don't keep comparing repositories if something went wrong
+        for _, _, task in pending:
+            if task is not None:
+                task.cancel()
+
 
+def main() -> None:
+    """Main entry point for the script."""
+    start_time = time.perf_counter()
+    args = parse_arguments()
+    old_repos = {
+        label: parse_repos_file(path) for label, path in args.old_rosdistro.items()
+    }
+    new_repos = parse_repos_file(args.new_rosdistro)
+    cache = None
+    if args.cache_dir:
+        cache = MirrorCache(args.cache_dir, int(args.cache_max_gb * 1024**3))
+
+    checkpoint = None
+    if args.resume or args.state_file:
+        try:
+            checkpoint = Checkpoint(
+                args.state_file or f"{args.output}.state",
+                [args.new_rosdistro, *args.old_rosdistro.values()],
+                resume=args.resume,
+            )
+        except ValueError as e:
+            sys.exit(f"Refusing to resume: {e}")
+
+    set_git_process_limit(args.git_processes)
+    try:
+        asyncio.run(write_comparisons(args, new_repos, old_repos, cache, checkpoint))
+        if checkpoint is not None:
+            checkpoint.remove()
+            checkpoint = None
+    finally:
+        if checkpoint is not None:
+            checkpoint.close()
+        if args.profile:
+            report = profiler.report()
+            report["wall_time"] = time.perf_counter() - start_time
+            with open(f"{args.output}.profile.json", mode="w", encoding="utf-8") as f:
+                json.dump(report, f, indent=2)
 
 if __name__ == "__main__":
     main()
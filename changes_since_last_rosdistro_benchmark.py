@@ -0,0 +1,418 @@
+#!/usr/bin/env python3
+"""Benchmark changes_since_last_rosdistro.py against synthetic git histories.
+
+This script builds a local git repository with an old and a new branch of a
+configurable shape, then times every stage of changes_since_last_rosdistro.py
+against it through a file:// URL, so no network access is needed.
+
+The new branch contains a mix of:
+  * cherry-picks of old branch commits, with "(backport #N)" in the title
+  * retitled backports, with a new title and one line of the change altered
+  * release commits, which only touch package.xml and CHANGELOG.rst
+  * commits that are only on the new branch
+
+Because the history is generated, the commits that are truly new are known,
+and the benchmark also reports how many of them the matching found.
+"""
+
+import argparse
+from dataclasses import dataclass, field
+import json
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import time
+
+import changes_since_last_rosdistro as cslr
+
+
+@dataclass
+class HistoryShape:
+    """Shape of a synthetic history."""
+
+    commits: int
+    cherry_pick_fraction: float
+    retitled_fraction: float
+    release_fraction: float
+    shared_file_fraction: float
+    packages: int
+    seed: int
+
+
+@dataclass
+class SyntheticHistory:
+    """A generated repository and what is known about its commits."""
+
+    path: str
+    old_branch: str
+    new_branch: str
+    # Titles of new branch commits that are not on the old branch
+    new_only_titles: set[str] = field(default_factory=set)
+
+
+class _FastImportStream:
+    """Writes a `git fast-import` stream, which is much faster than committing one by one."""
+
+    def __init__(self) -> None:
+        self._chunks: list[bytes] = []
+        self._mark = 0
+        self._time = 1_700_000_000
+
+    @staticmethod
+    def _data(content: str) -> bytes:
+        encoded = content.encode("utf-8")
+        return b"data %d\n" % len(encoded) + encoded + b"\n"
+
+    def commit(
+        self,
+        branch: str,
+        message: str,
+        files: dict[str, str],
+        parent: int | None = None,
+    ) -> int:
+        """Add a commit and return its mark."""
+        self._mark += 1
+        self._time += 60
+        chunk = b"commit refs/heads/%s\nmark :%d\n" % (branch.encode(), self._mark)
+        chunk += b"committer Bench <bench@example.com> %d +0000\n" % self._time
+        chunk += self._data(message)
+        if parent is not None:
+            chunk += b"from :%d\n" % parent
+        for path, content in files.items():
+            chunk += b"M 100644 inline %s\n" % path.encode() + self._data(content)
+        self._chunks.append(chunk)
+        return self._mark
+
+    def import_into(self, path: str) -> None:
+        subprocess.run(
+            ["git", "fast-import", "--quiet"],
+            cwd=path,
+            input=b"".join(self._chunks) + b"done\n",
+            check=True,
+        )
+
+
+_TITLE_WORDS = (
+    "add fix remove update refactor avoid allow use support handle make "
+    "timer node publisher subscription service client parameter executor "
+    "logging qos callback context memory leak race deadlock warning test "
+    "build windows macos docs lifecycle action serialization clock"
+).split()
+
+
+def _title(rng: random.Random) -> str:
+    return " ".join(rng.sample(_TITLE_WORDS, 4)).capitalize()
+
+
+def _change_lines(rng: random.Random, change: int) -> list[str]:
+    return [
+        f"int change_{change}_line_{i}() {{ return {rng.randrange(1 << 30)}; }}"
+        for i in range(10)
+    ]
+
+
+class _Branch:
+    """Tracks file contents of a branch while its history is generated."""
+
+    def __init__(self, name: str, stream: _FastImportStream, parent: int) -> None:
+        self.name = name
+        self._stream = stream
+        self._parent = parent
+        self._files: dict[str, list[str]] = {}
+
+    def commit(self, title: str, filename: str, lines: list[str]) -> None:
+        """Commit lines appended to a file."""
+        content = self._files.setdefault(filename, [])
+        content.extend(lines)
+        self.commit_files(title, {filename: "\n".join(content) + "\n"})
+
+    def commit_files(self, title: str, files: dict[str, str]) -> None:
+        """Commit whole file contents."""
+        self._parent = self._stream.commit(self.name, title, files, parent=self._parent)
+
+
+def build_history(directory: str, shape: HistoryShape) -> SyntheticHistory:
+    """Create a bare repository with a synthetic old and new branch.
+
+    Args:
+        directory (str): Directory in which to create the repository.
+        shape (HistoryShape): Shape of the history to generate.
+
+    Returns:
+        SyntheticHistory: The generated repository.
+    """
+    rng = random.Random(shape.seed)
+    path = os.path.join(directory, "synthetic.git")
+    subprocess.run(["git", "init", "--quiet", "--bare", path], check=True)
+    for key in ("uploadpack.allowFilter", "uploadpack.allowAnySHA1InWant"):
+        subprocess.run(["git", "config", key, "true"], cwd=path, check=True)
+
+    history = SyntheticHistory(path=path, old_branch="old", new_branch="new")
+    stream = _FastImportStream()
+    base_files = {}
+    for p in range(shape.packages):
+        base_files[f"pkg_{p}/package.xml"] = "<version>1.0.0</version>\n"
+        base_files[f"pkg_{p}/CHANGELOG.rst"] = "1.0.0\n"
+    base = stream.commit("old", "Initial commit", base_files)
+    old = _Branch("old", stream, base)
+    new = _Branch("new", stream, base)
+    new.commit_files("Initial commit", {})
+
+    def pick_file(change: int) -> str:
+        package = rng.randrange(shape.packages)
+        if rng.random() < shape.shared_file_fraction:
+            # Changes to the same file end up in the same CommitMatcher bucket
+            return f"pkg_{package}/src/pkg_{package}.cpp"
+        return f"pkg_{package}/src/change_{change}.cpp"
+
+    # Old branch: every commit adds lines to a new or shared source file
+    old_changes = []
+    for change in range(shape.commits):
+        filename = pick_file(change)
+        lines = _change_lines(rng, change)
+        title = f"{_title(rng)} (#{change + 1})"
+        old.commit(title, filename, lines)
+        old_changes.append((title, filename, lines))
+
+    # New branch: a shuffled mix of backports, releases and new changes
+    kinds = []
+    for kind, fraction in (
+        ("cherry-pick", shape.cherry_pick_fraction),
+        ("retitled", shape.retitled_fraction),
+        ("release", shape.release_fraction),
+    ):
+        kinds += [kind] * int(shape.commits * fraction)
+    kinds += ["new"] * max(0, shape.commits - len(kinds))
+    rng.shuffle(kinds)
+    backports = iter(rng.sample(old_changes, len(old_changes)))
+
+    version = 0
+    for change, kind in enumerate(kinds, start=shape.commits):
+        if kind == "cherry-pick":
+            title, filename, lines = next(backports)
+            new.commit(title.replace("(#", "(backport #"), filename, lines)
+        elif kind == "retitled":
+            _, filename, lines = next(backports)
+            lines = lines[:-1] + [f"// adjusted while backporting change {change}"]
+            new.commit(f"{_title(rng)} (#{change + 1})", filename, lines)
+        elif kind == "release":
+            version += 1
+            files = {}
+            for p in range(shape.packages):
+                files[f"pkg_{p}/package.xml"] = f"<version>2.{version}.0</version>\n"
+                files[f"pkg_{p}/CHANGELOG.rst"] = f"2.{version}.0\n"
+            new.commit_files(f"2.{version}.0", files)
+        else:
+            filename = pick_file(change)
+            title = f"{_title(rng)} (#{change + 1})"
+            new.commit(title, filename, _change_lines(rng, change))
+            history.new_only_titles.add(title)
+
+    stream.import_into(path)
+    return history
+
+
+class StageTimer:
+    """Times named stages and keeps the results in order."""
+
+    def __init__(self) -> None:
+        self.results: dict[str, float] = {}
+
+    def time(self, name: str, func, *args, **kwargs):
+        start = time.perf_counter()
+        value = func(*args, **kwargs)
+        self.results[name] = time.perf_counter() - start
+        print(f"{name:<28} {self.results[name]:9.3f} s", file=sys.stderr)
+        return value
+
+
+def run_benchmark(history: SyntheticHistory, args: argparse.Namespace) -> dict:
+    """Time every stage of changes_since_last_rosdistro.py on a synthetic history.
+
+    Args:
+        history (SyntheticHistory): The repository to benchmark against.
+        args (argparse.Namespace): Parsed command line arguments.
+
+    Returns:
+        dict: Stage timings and matching results.
+    """
+    url = f"file://{history.path}"
+    old_branch = history.old_branch
+    new_branch = history.new_branch
+    branches = [old_branch, new_branch]
+    timer = StageTimer()
+    cache = None
+    cache_dir = None
+    if args.cache:
+        cache_dir = tempfile.TemporaryDirectory()
+        cache = cslr.MirrorCache(cache_dir.name, 1 << 40)
+
+    repo = timer.time(
+        "clone", cslr.ClonedRepository, url, new_branch, cache=cache, blobless=args.blobless
+    )
+    base = timer.time("find_common_ancestor", repo.find_common_ancestor, new_branch, old_branch)
+    timer.time("prefetch_blobs", repo.prefetch_blobs, base, branches)
+    old_commits = timer.time(
+        "iterate_commits (old)",
+        lambda: [c for c in repo.iterate_commits(base, old_branch) if not cslr.is_probably_release_commit(c)],
+    )
+    new_commits = timer.time(
+        "iterate_commits (new)",
+        lambda: [c for c in repo.iterate_commits(base, new_branch) if not cslr.is_probably_release_commit(c)],
+    )
+    if args.lazy_metadata:
+        # Commits constructed from a hash alone read their metadata one
+        # subprocess at a time, which is how every commit used to be read.
+        timer.time(
+            "Commit.modified_files (lazy)",
+            lambda: [cslr.Commit(repo.path, c.hash).modified_files for c in new_commits],
+        )
+    patch_ids = timer.time("patch_ids", repo.patch_ids, base, branches)
+    changed_lines = None
+    if args.content_matching:
+        changed_lines = timer.time("changed_lines", repo.changed_lines, base, branches)
+
+    matcher = cslr.CommitMatcher(old_commits, new_commits, patch_ids, changed_lines)
+    probably_new = timer.time(
+        "CommitMatcher", lambda: (matcher.probably_same(), matcher.probably_new())[1]
+    )
+    if args.all_pairs:
+        timer.time(
+            "all pairs baseline",
+            lambda: [
+                n for n in new_commits
+                if not any(cslr.commits_are_probably_same(o, n) for o in old_commits)
+            ],
+        )
+
+    found_new = {c.first_message_line for c in probably_new}
+    expected_new = history.new_only_titles
+    if cache_dir is not None:
+        cache_dir.cleanup()
+    return {
+        "stages": timer.results,
+        "old_commits": len(old_commits),
+        "new_commits": len(new_commits),
+        "exact_matches": sum(1 for exact in matcher.exact_matches if exact),
+        "content_matches": len(matcher.content_matches),
+        "expected_new": len(expected_new),
+        "reported_new": len(found_new),
+        "correctly_reported_new": len(found_new & expected_new),
+    }
+
+
+def parse_arguments() -> argparse.Namespace:
+    """Parse command line arguments.
+
+    Returns:
+        argparse.Namespace: The parsed arguments.
+    """
+    parser = argparse.ArgumentParser(
+        description="Benchmark changes_since_last_rosdistro.py against a synthetic git history."
+    )
+    parser.add_argument(
+        "--commits",
+        type=int,
+        default=1000,
+        help="Number of commits on each branch (default: %(default)s).",
+    )
+    parser.add_argument(
+        "--cherry-pick-fraction",
+        type=float,
+        default=0.4,
+        help="Fraction of new branch commits that are cherry-picks (default: %(default)s).",
+    )
+    parser.add_argument(
+        "--retitled-fraction",
+        type=float,
+        default=0.1,
+        help="Fraction of new branch commits that are retitled and slightly "
+        "changed backports (default: %(default)s).",
+    )
+    parser.add_argument(
+        "--release-fraction",
+        type=float,
+        default=0.05,
+        help="Fraction of new branch commits that are release commits (default: %(default)s).",
+    )
+    parser.add_argument(
+        "--shared-file-fraction",
+        type=float,
+        default=0.5,
+        help="Fraction of commits that change a file shared with other commits "
+        "instead of adding a new file (default: %(default)s).",
+    )
+    parser.add_argument(
+        "--packages",
+        type=int,
+        default=20,
+        help="Number of packages in the repository (default: %(default)s).",
+    )
+    parser.add_argument(
+        "--seed",
+        type=int,
+        default=0,
+        help="Random seed for the generated history (default: %(default)s).",
+    )
+    parser.add_argument(
+        "--blobless",
+        action="store_true",
+        help="Benchmark blobless clones.",
+    )
+    parser.add_argument(
+        "--cache",
+        action="store_true",
+        help="Benchmark cloning into a (new, empty) mirror cache.",
+    )
+    parser.add_argument(
+        "--content-matching",
+        action="store_true",
+        help="Benchmark content based matching.",
+    )
+    parser.add_argument(
+        "--lazy-metadata",
+        action="store_true",
+        help="Also time reading metadata with one subprocess per commit.",
+    )
+    parser.add_argument(
+        "--all-pairs",
+        action="store_true",
+        help="Also time calling commits_are_probably_same() on every pair of commits.",
+    )
+    parser.add_argument(
+        "--json",
+        help="Path to write the results to as JSON.",
+    )
+    return parser.parse_args()
+
+
+def main() -> None:
+    """Main entry point for the script."""
+    args = parse_arguments()
+    shape = HistoryShape(
+        commits=args.commits,
+        cherry_pick_fraction=args.cherry_pick_fraction,
+        retitled_fraction=args.retitled_fraction,
+        release_fraction=args.release_fraction,
+        shared_file_fraction=args.shared_file_fraction,
+        packages=args.packages,
+        seed=args.seed,
+    )
+
+    with tempfile.TemporaryDirectory() as directory:
+        start = time.perf_counter()
+        history = build_history(directory, shape)
+        print(f"{'build history':<28} {time.perf_counter() - start:9.3f} s", file=sys.stderr)
+        results = run_benchmark(history, args)
+
+    results["shape"] = vars(shape)
+    print(json.dumps(results, indent=2))
+    if args.json:
+        with open(args.json, mode="w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
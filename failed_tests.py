@@ -3,149 +3,1888 @@
 import sys
 import re
 import argparse
+import csv
+import gzip
+import hashlib
+import io
+import json
+import lzma
+import mmap
+import os
+import time
+import xml.etree.ElementTree as ET
+from concurrent.futures import ProcessPoolExecutor
+from collections import defaultdict, deque, namedtuple
+from contextlib import contextmanager
+from itertools import accumulate
 
-def extract_package_logs(lines):
+# Start and end of a package's output block, for finding them in undecoded log files
+PACKAGE_START_BYTES_RE = re.compile(rb'---[ \t]*output:[ \t]+(\S+)')
+PACKAGE_END_BYTES_RE = re.compile(rb'Finished <<<[ \t]+(\S+)')
+# Lines of a buffer, the last one without a newline at the end of the log
+LINE_BYTES_RE = re.compile(rb'[^\n]*\n|[^\n]+\Z')
+LINE_TEXT_RE = re.compile(r'[^\n]*\n|[^\n]+\Z')
+
+GZIP_MAGIC = b'\x1f\x8b'
+XZ_MAGIC = b'\xfd7zXZ\x00'
+
+# Start and end of a package's output block. Each pattern of LINE_RE has a
+# single named group, so the name of the group that matched tells what kind
+# of line it is.
+PACKAGE_PATTERNS = (
+    r'---\s*output:\s+(?P<package_start>[^\s]+)',
+    r'Finished <<<\s+(?P<package_end>[^\s]+)',
+)
+PACKAGE_TRIGGER_TOKENS = ("---", "Finished <<<")
+
+# One pattern for every line of interest, rebuilt by register_parser() from
+# PACKAGE_PATTERNS followed by the patterns of every registered parser
+LINE_RE = re.compile('|'.join(PACKAGE_PATTERNS))
+
+# Every line in a package block that LINE_RE can match contains at least one of these
+TRIGGER_TOKENS = PACKAGE_TRIGGER_TOKENS
+
+# Kinds of lines that say a test failed, from every registered parser
+FAILURE_KINDS = set()
+
+# Every line in a package block that can make a parser report a failure contains at least one of these
+FAILURE_TOKENS = ()
+
+# Every line in a package block that a collecting parser does more with than
+# add it to its blocks contains at least one of these or of TRIGGER_TOKENS
+COLLECT_TOKENS = ()
+
+# Registered TestParser subclasses, in the order their patterns are tried
+PARSERS = []
+
+# CTest prefixes the output of the test with its number: e.g. "12: "
+CTEST_PREFIX_RE = re.compile(r'^\d+: ')
+# The result of a CTest test: e.g. "3/5 Test #3: test_name .....***Failed  0.05 sec"
+CTEST_RESULT_RE = re.compile(r'Test\s+#\d+: (\S+) ')
+# A test in CTest's list of failed tests: e.g. "	  3 - test_name (Timeout)"
+CTEST_SUMMARY_ENTRY_RE = re.compile(r'^\s*(\d+) - (\S+) \(')
+
+# Exit codes of launched processes that crashed: SIGILL, SIGABRT, SIGBUS, SIGFPE and SIGSEGV
+LAUNCH_CRASH_EXIT_CODES = {-4, -6, -7, -8, -11}
+LAUNCH_EXIT_CODE_RE = re.compile(r'exit code (-?\d+)')
+
+# Counts in a line of "colcon test-result": e.g. "...: 5 tests, 0 errors, 1 failure, 0 skipped"
+COLCON_RESULT_COUNTS_RE = re.compile(r': \d+ tests?, (\d+) errors?, (\d+) failures?')
+# Package of a test result file: e.g. "build/pkg/test_results/pkg/test_foo.gtest.xml"
+COLCON_RESULT_PACKAGE_RE = re.compile(r'(?:^|/)test_results/([^/]+)/|(?:^|/)build/([^/]+)/')
+
+# Lines of context shown around a failure whose output block could not be isolated
+CONTEXT_BEFORE = 5
+CONTEXT_AFTER = 15
+
+# The span is the (start, end) byte offsets of the output in the log file, if
+# known, and the framework is that of the parser that found the failure
+Failure = namedtuple(
+    'Failure', ['package', 'test', 'output', 'isolated', 'span', 'framework'],
+    defaults=(None, None))
+
+# Which packages a build's log ran, and the failed tests of each of them.
+# If requested, also the log's failure clusters by fingerprint.
+LogSummary = namedtuple(
+    'LogSummary', ['build', 'packages', 'failed_tests', 'clusters'], defaults=(None,))
+
+# Replacements that make the output of the same failure look the same across
+# tests, builds and machines before it is fingerprinted
+FINGERPRINT_SUBSTITUTIONS = [
+    # CTest test number prefixes: e.g. "12: "
+    (re.compile(r'^\d+: ', re.MULTILINE), ''),
+    (re.compile(r'0x[0-9a-fA-F]+'), '0xADDR'),
+    (re.compile(r'\d{4}-\d{2}-\d{2}[T ]\d{2}:\d{2}:\d{2}(?:[.,]\d+)?(?:Z|[+-]\d{2}:?\d{2})?'), 'TIMESTAMP'),
+    (re.compile(r'\b\d{2}:\d{2}:\d{2}(?:\.\d+)?\b'), 'TIME'),
+    # ROS log timestamps: e.g. "[1700000000.123456789]"
+    (re.compile(r'\[\d{9,}\.\d+\]'), '[TIMESTAMP]'),
+    (re.compile(r'(?:/private)?(?:/var)?/(?:tmp|folders)/[^\s\'":]*'), 'TMPPATH'),
+    # Line numbers: e.g. "test_foo.cpp:12:" or 'File "test_foo.py", line 12'
+    (re.compile(r'(\.\w+):\d+'), r'\1:N'),
+    (re.compile(r'\bline \d+'), 'line N'),
+    (re.compile(r'\(\d+(?:\.\d+)? ?m?s\)'), '(DURATION)'),
+    (re.compile(r'\b(?:pid|PID|process) \d+'), 'pid N'),
+    # Separators padded to the length of the test name: e.g. "____ test_foo ____"
+    (re.compile(r'([_=-])\1{2,}'), r'\1\1\1'),
+]
+
+# Characters that aren't allowed in XML 1.0, such as most terminal control characters
+XML_INVALID_CHARS_RE = re.compile('[^\t\n\r\x20-\ud7ff\ue000-\ufffd\U00010000-\U0010ffff]')
+
+# Last line of a Jenkins console log, after which a followed log won't grow
+JENKINS_FINISHED_RE = re.compile(r'^Finished: [A-Z_]+\s*$')
+
+# Bytes to read at a time from a followed log file
+FOLLOW_CHUNK_SIZE = 1024 * 1024
+
+# Bytes to read at a time from a compressed log file or stdin
+READ_CHUNK_SIZE = 1024 * 1024
+
+# Bytes of a log after which skipping lines is given up on or tried again, as it
+# costs more than it saves unless it skips at least a SKIP_MIN_SHARE of them
+SKIP_STRETCH = 1024 * 1024
+SKIP_MIN_SHARE = 0.25
+# Most stretches in a row fed line by line after skipping did not pay off
+SKIP_MAX_BACKOFF = 16
+
+# Version of the sidecar index format, to be bumped whenever it changes
+INDEX_VERSION = 3
+
+# Suffixes that are not part of a build's name, e.g. in "<job>_<number>.txt.gz"
+LOG_SUFFIXES = ('.gz', '.xz', '.txt', '.log')
+
+
+def match_line(line):
     """
-    Parses the log to isolate the output block for each package.
-    Matches from '--- output: <package>' to 'Finished <<< <package>'
+    Matches a log line against LINE_RE.
+
+    Almost no lines are of interest, so lines without any of the trigger
+    tokens are rejected by cheap substring checks before the regex runs.
     """
-    package_logs = {}
-    current_pkg = None
-    
-    # Regex to match the start and end of a package's output block
-    start_re = re.compile(r'---\s*output:\s+([^\s]+)')
-    end_re = re.compile(r'Finished <<<\s+([^\s]+)')
-    
-    for line in lines:
-        start_match = start_re.search(line)
-        if start_match:
-            current_pkg = start_match.group(1).strip()
-            package_logs[current_pkg] = []
-            
-        if current_pkg:
-            package_logs[current_pkg].append(line)
-            
-        end_match = end_re.search(line)
-        if end_match and current_pkg == end_match.group(1).strip():
-            current_pkg = None
-            
-    return package_logs
-
-def find_failed_tests(log_lines):
-    """
-    Scans the lines of a package log to identify the names of tests that failed.
-    """
-    failed_tests = set()
-    
-    # Matches GTest failures: e.g. "[  FAILED  ] TestName"
-    gtest_re = re.compile(r'\[\s*FAILED\s*\]\s+([^\s]+)')
-    
-    # Matches PyTest / Python Unittest failures: e.g. "FAIL: test_name" or "ERROR: test_name"
-    unittest_re = re.compile(r'^(?:\d+:\s+)?(?:FAIL|ERROR):\s+([^\s]+)')
-    
-    # Matches raw PyTest summary failures: e.g. "FAILED path/to/file.py::test_name"
-    pytest_summary_re = re.compile(r'FAILED\s+.*::([^\s]+)')
-    
-    for line in log_lines:
+    for token in TRIGGER_TOKENS:
+        if token in line:
+            return LINE_RE.search(line)
+    return None
+
+
+def pytest_test_name(title):
+    """
+    Converts the title pytest underlines, e.g. "TestClass.test_name[param]", to a test name.
+    """
+    for prefix in ("ERROR at setup of ", "ERROR at teardown of "):
+        if title.startswith(prefix):
+            title = title[len(prefix):]
+    base, bracket, params = title.partition("[")
+    if "/" not in base:
+        base = base.rsplit(".", 1)[-1]
+    return base + bracket + params
+
+
+class _Block:
+    """
+    Output of a failed test that is still being collected.
+    """
+
+    def __init__(self, test, lines=(), start=None, framework=None, line_starts=None):
+        self.test = test
+        self.framework = framework
+        self.lines = list(lines)
+        # Byte offsets of the output in the log file, if known
+        self.start = start
+        self.end = start
+        # Byte offset of each line, so lines can be dropped from the end again
+        self.line_starts = list(line_starts) if line_starts is not None else [start] * len(self.lines)
+        # Dashed lines seen in a Unittest block, or lines still to add to a context
+        self.count = 0
+        # False if the lines are only the context around a mention of the test
+        self.isolated = True
+        # True if the failure is only reported when nothing else failed in its package
+        self.fallback = False
+        # Package of a block found outside of package blocks
+        self.package = None
+
+    def append(self, line, start, end):
+        self.lines.append(line)
+        self.line_starts.append(start)
+        self.end = end
+
+    def extend(self, lines, starts, end):
+        self.lines.extend(lines)
+        self.line_starts.extend(starts)
+        self.end = end
+
+    def failure(self, package):
+        span = None if self.start is None else (self.start, self.end)
+        return Failure(
+            self.package or package, self.test, "".join(self.lines), self.isolated, span,
+            self.framework)
+
+
+def _tokens_re(tokens):
+    """
+    Compiles a regex that matches any of some byte string tokens.
+    """
+    # An empty alternation would match everywhere instead of nowhere
+    return re.compile(b'|'.join(re.escape(token) for token in tokens) or b'(?!)')
+
+
+def _search(regex, buf, pos, end):
+    """
+    Returns the offset of the first match of a regex in the buffer from pos to end, or end if there is none.
+    """
+    match = regex.search(buf, pos, end)
+    return match.start() if match else end
+
+
+def _find_last(buf, tokens, start, end):
+    """
+    Returns the offset of the last of some tokens in a buffer from start to end, or -1 if there is none.
+    """
+    last = -1
+    for token in tokens:
+        # Only a token after the last one found so far matters
+        found = buf.rfind(token, max(start, last + 1), end)
+        if found != -1:
+            last = found
+    return last
+
+
+def _line_start(buf, pos, offset):
+    """
+    Returns the start of the line of a buffer an offset is in, but not before pos, a line start.
+    """
+    if offset >= len(buf):
+        return len(buf)
+    return max(pos, buf.rfind(b'\n', pos, offset) + 1)
+
+
+class TestParser:
+    """
+    Recognizes the failed tests of one test framework, one line at a time.
+
+    Subclasses declare patterns, each with a single named group, and trigger
+    tokens of which every line their patterns match contains at least one.
+    register_parser() adds them to LINE_RE, so every line of a log is matched
+    once however many frameworks there are. feed() is called with every line
+    one of the parser's patterns matched, and with every line while the parser
+    is collecting, and returns the _Blocks of the failed tests it completed.
+    """
+
+    framework = None
+    patterns = ()
+    trigger_tokens = ()
+    # Kinds of lines that say a test failed
+    failure_kinds = ()
+    # Tokens of which every line that completes a failed test's block, or is
+    # of a failure kind, contains at least one
+    failure_tokens = ()
+    # Tokens, besides the trigger tokens, of the lines that do more than add
+    # to the blocks being collected
+    collect_tokens = ()
+    # Whether the parser reads package blocks or the lines between them
+    in_packages = True
+
+    def __init__(self):
+        self.collecting = False
+
+    def start(self):
+        """
+        Resets the parser at the start of a package block.
+        """
+        self.collecting = False
+
+    def feed(self, line, start, end, match, kind):
+        """
+        Processes a line and returns the blocks it completed.
+
+        start and end are the byte offsets of the line in the log file, if
+        known, and kind is the name of the LINE_RE group that matched, if any.
+        """
+        return []
+
+    def extend(self, lines, starts, end):
+        """
+        Processes lines without trigger or collect tokens while collecting and returns the blocks they completed.
+
+        starts are the byte offsets of the lines in the log file and end is
+        where the last one ends. Lines after the parser stopped collecting
+        are ignored.
+        """
+        blocks = []
+        for i, line in enumerate(lines):
+            if not self.collecting:
+                break
+            line_end = starts[i + 1] if i + 1 < len(lines) else end
+            blocks.extend(self.feed(line, starts[i], line_end, None, None))
+        return blocks
+
+    def close(self):
+        """
+        Returns the blocks still open at the end of a package block, or of the log.
+        """
+        return []
+
+    def failed_test(self, match, line):
+        """
+        Returns the name of the failed test a line of one of the failure kinds mentions, if any.
+
+        A mentioned test that has no block by the end of its package block is
+        shown with the lines around its first mention instead.
+        """
         if "listed below" in line:
+            return None
+        return match.group(match.lastgroup)
+
+
+def register_parser(parser_class):
+    """
+    Adds a TestParser subclass to the parsers every FailureExtractor runs.
+
+    Can be used as a class decorator. Patterns are tried in the order their
+    parsers were registered, so they can't take lines from earlier parsers.
+    """
+    global LINE_RE, TRIGGER_TOKENS, FAILURE_KINDS, FAILURE_TOKENS, COLLECT_TOKENS
+    parser_class.kinds = tuple(
+        kind for pattern in parser_class.patterns for kind in re.compile(pattern).groupindex)
+    PARSERS.append(parser_class)
+    LINE_RE = re.compile('|'.join(
+        PACKAGE_PATTERNS + tuple(pattern for cls in PARSERS for pattern in cls.patterns)))
+    TRIGGER_TOKENS = tuple(dict.fromkeys(
+        tuple(token for cls in PARSERS if cls.in_packages for token in cls.trigger_tokens)
+        + PACKAGE_TRIGGER_TOKENS))
+    FAILURE_KINDS = {kind for cls in PARSERS for kind in cls.failure_kinds}
+    FAILURE_TOKENS = tuple(dict.fromkeys(
+        token for cls in PARSERS if cls.in_packages for token in cls.failure_tokens))
+    COLLECT_TOKENS = tuple(dict.fromkeys(
+        token for cls in PARSERS if cls.in_packages for token in cls.collect_tokens))
+    return parser_class
+
+
+@register_parser
+class GTestParser(TestParser):
+    """
+    GTest blocks: e.g. "[ RUN      ] TestName" until "[  FAILED  ] TestName".
+    """
+
+    framework = 'gtest'
+    patterns = (
+        r'\[ RUN      \]\s+(?P<gtest_run>[^\s]+)',
+        r'\[\s*OK\s*\]\s+(?P<gtest_ok>[^\s]+)',
+        r'\[\s*FAILED\s*\]\s+(?P<gtest_failed>[^\s]+)',
+    )
+    trigger_tokens = ("FAIL", "RUN", "OK")
+    failure_kinds = ('gtest_failed',)
+    failure_tokens = ("FAIL",)
+
+    def start(self):
+        super().start()
+        self._blocks = {}
+
+    def feed(self, line, start, end, match, kind):
+        if kind == 'gtest_run':
+            self._blocks[match.group(kind)] = _Block(match.group(kind), start=start, framework=self.framework)
+        for block in self._blocks.values():
+            block.append(line, start, end)
+        blocks = []
+        if kind == 'gtest_failed' and match.group(kind) in self._blocks:
+            blocks.append(self._blocks.pop(match.group(kind)))
+        if kind == 'gtest_ok':
+            self._blocks.pop(match.group(kind), None)
+        self.collecting = bool(self._blocks)
+        return blocks
+
+    def extend(self, lines, starts, end):
+        for block in self._blocks.values():
+            block.extend(lines, starts, end)
+        return []
+
+    def failed_test(self, match, line):
+        name = super().failed_test(match, line)
+        if name is not None and "ms)" in name:
+            return None
+        return name
+
+
+@register_parser
+class UnittestParser(TestParser):
+    """
+    PyTest / Python Unittest failures: e.g. "FAIL: test_name" or "ERROR: test_name".
+    """
+
+    framework = 'unittest'
+    patterns = (r'^(?:\d+:\s+)?(?:FAIL|ERROR):\s+(?P<unittest>[^\s]+)',)
+    trigger_tokens = ("FAIL", "ERROR")
+    failure_kinds = ('unittest',)
+    failure_tokens = ("FAIL", "ERROR")
+
+    def start(self):
+        super().start()
+        self._block = None
+
+    def feed(self, line, start, end, match, kind):
+        blocks = []
+        if kind == 'unittest':
+            if self._block:
+                blocks.append(self._block)
+            self._block = _Block(match.group(kind), start=start, framework=self.framework)
+        self._block.append(line, start, end)
+        # Unittest tracebacks are between two dashed lines
+        if "-" * 70 in line:
+            self._block.count += 1
+            if self._block.count >= 2:
+                blocks.append(self._block)
+                self._block = None
+        self.collecting = self._block is not None
+        return blocks
+
+    def extend(self, lines, starts, end):
+        self._block.extend(lines, starts, end)
+        return []
+
+    def close(self):
+        return [self._block] if self._block else []
+
+
+@register_parser
+class PytestParser(TestParser):
+    """
+    Pytest underlines the name of each failed test: e.g. "_____ test_name _____".
+    """
+
+    framework = 'pytest'
+    patterns = (
+        # Raw PyTest summary failures: e.g. "FAILED path/to/file.py::test_name"
+        r'FAILED\s+.*::(?P<pytest_summary>[^\s]+)',
+        r'^(?:\d+:\s+)?_{3,} (?P<pytest_header>.+?) _{3,}\s*$',
+        # Sections such as "===== short test summary info =====" end a test's output
+        r'^(?:\d+:\s+)?(?P<pytest_section>={3,})',
+    )
+    trigger_tokens = ("FAIL", "___", "===")
+    failure_kinds = ('pytest_summary',)
+    failure_tokens = ("FAIL", "___")
+
+    def start(self):
+        super().start()
+        self._block = None
+
+    def feed(self, line, start, end, match, kind):
+        blocks = []
+        if self._block and kind in ('pytest_header', 'pytest_section'):
+            blocks.append(self._block)
+            self._block = None
+        if kind == 'pytest_header':
+            self._block = _Block(pytest_test_name(match.group(kind)), start=start, framework=self.framework)
+        if self._block:
+            self._block.append(line, start, end)
+        self.collecting = self._block is not None
+        return blocks
+
+    def extend(self, lines, starts, end):
+        self._block.extend(lines, starts, end)
+        return []
+
+    def close(self):
+        return [self._block] if self._block else []
+
+
+@register_parser
+class CTestParser(TestParser):
+    """
+    CTest tests: e.g. "Start 3: test_name" until "3/5 Test #3: test_name ...***Failed".
+
+    A test's block isn't reported if other frameworks found failures in it,
+    because those are more precise. Tests in CTest's list of failed tests
+    without a result line of their own are reported if nothing else failed
+    in the package.
+    """
+
+    framework = 'ctest'
+    patterns = (
+        r'^\s*Start\s+\d+: (?P<ctest_start>\S+)',
+        r'^(?P<ctest_summary>The following tests FAILED:)',
+    )
+    trigger_tokens = ("Start", "FAIL")
+    failure_tokens = ("***", "FAIL")
+    # Result lines: e.g. "3/5 Test #3: test_name ....   Passed"
+    collect_tokens = ("Test",)
+
+    def start(self):
+        super().start()
+        self._block = None
+        self._nested_failure = False
+        self._results = set()
+        self._summary = False
+
+    def feed(self, line, start, end, match, kind):
+        blocks = []
+        if self._summary:
+            entry = CTEST_SUMMARY_ENTRY_RE.match(line)
+            if entry is None:
+                self._summary = False
+            elif entry.group(2) not in self._results:
+                block = _Block(entry.group(2), start=start, framework=self.framework)
+                block.append(line, start, end)
+                block.isolated = False
+                block.fallback = True
+                blocks.append(block)
+
+        if kind == 'ctest_start':
+            self._block = _Block(match.group(kind), start=start, framework=self.framework)
+            self._nested_failure = False
+        elif kind in FAILURE_KINDS:
+            self._nested_failure = True
+        if self._block:
+            self._block.append(line, start, end)
+
+        # Result lines are only looked for in tests whose start was seen
+        result = CTEST_RESULT_RE.search(line) if self._block and "Test" in line else None
+        if result:
+            test = result.group(1)
+            self._results.add(test)
+            failed = "***" in line and "***Skipped" not in line
+            if failed and self._block.test == test and not self._nested_failure:
+                blocks.append(self._block)
+            self._block = None
+        if kind == 'ctest_summary':
+            self._summary = True
+        self.collecting = self._block is not None or self._summary
+        return blocks
+
+    def extend(self, lines, starts, end):
+        if self._summary:
+            # Any line but an entry ends the summary
+            return super().extend(lines, starts, end)
+        self._block.extend(lines, starts, end)
+        return []
+
+
+@register_parser
+class Catch2Parser(TestParser):
+    """
+    Catch2 test cases: a dashed line, the test case name, and another dashed line.
+
+    The test case's output is until the next dashed line, or until the
+    "=====" line before the totals. Tests run in parallel by "ctest -j"
+    interleave their lines, so only lines with the CTest test number prefix
+    of a test case's first dashed line are part of it.
+    """
+
+    framework = 'catch2'
+    patterns = (
+        r'^(?:\d+:\s+)?(?P<catch2_separator>-{79})\s*$',
+        # e.g. "/path/to/test_foo.cpp:12: FAILED:"
+        r'^(?:\d+:\s+)?\S+:\d+: (?P<catch2_failed>FAILED):',
+    )
+    trigger_tokens = ("---", "FAIL")
+    failure_kinds = ('catch2_failed',)
+    failure_tokens = ("FAIL",)
+
+    def start(self):
+        super().start()
+        # Open test case and whether it failed by CTest test number prefix
+        self._blocks = {}
+        self._failed = set()
+
+    def feed(self, line, start, end, match, kind):
+        blocks = []
+        prefix = CTEST_PREFIX_RE.match(line)
+        prefix = prefix.group(0) if prefix else ''
+        block = self._blocks.get(prefix)
+        if kind == 'catch2_separator':
+            # The second dashed line ends the test case name
+            if block is None or block.count >= 2:
+                blocks.extend(self._close(prefix))
+                block = self._blocks[prefix] = _Block(None, start=start, framework=self.framework)
+            block.count += 1
+        elif block is not None:
+            if block.test is None:
+                block.test = line[len(prefix):].strip()
+            if kind == 'catch2_failed':
+                self._failed.add(prefix)
+            elif "=" * 79 in line:
+                blocks.extend(self._close(prefix))
+                block = None
+        if block is not None:
+            block.append(line, start, end)
+        self.collecting = bool(self._blocks)
+        return blocks
+
+    def _close(self, prefix):
+        block = self._blocks.pop(prefix, None)
+        failed = prefix in self._failed
+        self._failed.discard(prefix)
+        return [block] if block is not None and failed else []
+
+    def close(self):
+        blocks = []
+        for prefix in list(self._blocks):
+            blocks.extend(self._close(prefix))
+        return blocks
+
+    def failed_test(self, match, line):
+        # The failure is reported with its test case's block
+        return None
+
+
+@register_parser
+class LaunchTestingParser(TestParser):
+    """
+    Processes launch_testing started that crashed: e.g. "[talker-1]: process has died [pid 12, exit code -11, ...".
+
+    Crashes have no block of their own, so they are shown with the lines around them.
+    """
+
+    framework = 'launch_testing'
+    patterns = (r'\[(?P<launch_process_died>[^\]\s]+)\]: process has died',)
+    trigger_tokens = ("process has died",)
+    failure_kinds = ('launch_process_died',)
+    failure_tokens = ("process has died",)
+
+    def failed_test(self, match, line):
+        exit_code = LAUNCH_EXIT_CODE_RE.search(line)
+        if exit_code is None or int(exit_code.group(1)) not in LAUNCH_CRASH_EXIT_CODES:
+            return None
+        return match.group(match.lastgroup)
+
+
+@register_parser
+class ColconTestResultParser(TestParser):
+    """
+    Output of "colcon test-result" after the package blocks.
+
+    Each result file with failures or errors is followed by, with --verbose,
+    "- classname name" and the failure message indented below it. These are
+    only reported for packages without failures found in their own output.
+    Reading only some packages without the index skips the lines between
+    package blocks, so then these aren't found.
+    """
+
+    framework = 'colcon'
+    patterns = (r'^(?P<colcon_result>\S+\.xml): \d+ tests?, ',)
+    trigger_tokens = (".xml: ",)
+    in_packages = False
+
+    def __init__(self):
+        super().__init__()
+        self._result = None
+        self._block = None
+
+    def feed(self, line, start, end, match, kind):
+        blocks = []
+        if kind == 'colcon_result':
+            blocks.extend(self.close())
+            counts = COLCON_RESULT_COUNTS_RE.search(line)
+            if counts and (int(counts.group(1)) or int(counts.group(2))):
+                path = match.group(kind)
+                package = COLCON_RESULT_PACKAGE_RE.search(path)
+                self._result = _Block(
+                    os.path.basename(path)[:-len('.xml')], [line], start, self.framework)
+                self._result.end = end
+                self._result.isolated = False
+                self._result.fallback = True
+                self._result.package = (
+                    package.group(1) or package.group(2) if package
+                    else os.path.basename(os.path.dirname(path)) or path)
+        elif self._result is not None and line.startswith('- '):
+            if self._block is not None:
+                blocks.append(self._block)
+            classname, _, name = line[2:].strip().partition(' ')
+            self._block = _Block(
+                f"{classname}.{name}" if name else classname, [line], start, self.framework)
+            self._block.end = end
+            self._block.package = self._result.package
+            self._block.fallback = True
+        elif self._block is not None and line.startswith('  '):
+            self._block.append(line, start, end)
+        elif self._result is not None:
+            blocks.extend(self.close())
+        self.collecting = self._result is not None
+        return blocks
+
+    def close(self):
+        blocks = []
+        if self._block is not None:
+            blocks.append(self._block)
+        elif self._result is not None:
+            # Without --verbose only the result file is known
+            blocks.append(self._result)
+        self._result = None
+        self._block = None
+        self.collecting = False
+        return blocks
+
+
+class FailureExtractor:
+    """
+    Finds failed tests and their output in a single forward pass over a log.
+
+    Lines are fed one at a time. Each line is matched once against LINE_RE,
+    which has the patterns of every registered parser, and is handed to the
+    parser whose pattern matched and to the parsers still collecting a block.
+    Each failure is returned as soon as its block closes. Memory is bounded
+    by the largest single test block instead of the size of the log.
+    """
+
+    def __init__(self, packages=None):
+        self.packages = set(packages) if packages else None
+        self.package = None
+        # Every package whose block was seen, whether or not its tests failed
+        self.packages_seen = set()
+        # (package, start, end) of every package block, with byte offsets if known
+        self.package_spans = []
+        parsers = [parser_class() for parser_class in PARSERS]
+        self._parsers = [parser for parser in parsers if parser.in_packages]
+        self._owners = {kind: parser for parser in self._parsers for kind in parser.kinds}
+        self._outside_parsers = [parser for parser in parsers if not parser.in_packages]
+        self._outside_owners = {
+            kind: parser for parser in self._outside_parsers for kind in parser.kinds}
+        self._outside_tokens = tuple(
+            token for parser in self._outside_parsers for token in parser.trigger_tokens)
+        self._outside_collecting = []
+        # Packages with failures found in their own output
+        self._failed_packages = set()
+
+    def _start_package(self, package, start):
+        self.package = package
+        self.packages_seen.add(package)
+        self._package_start = start
+        self._package_end = start
+        for parser in self._parsers:
+            parser.start()
+        self._collecting = []
+        # Failure context by test name, or None once its block was found
+        self._contexts = {}
+        self._open_contexts = []
+        self._recent = deque(maxlen=CONTEXT_BEFORE)
+        self._recent_starts = deque(maxlen=CONTEXT_BEFORE)
+
+    def feed(self, line, span=None):
+        """
+        Processes the next line of the log and returns the failures it completed.
+
+        The span is the (start, end) byte offsets of the line in the log file,
+        if known. Failures then have the span of their output in the log.
+        """
+        # Outside of package blocks only the start of the next one matters,
+        # and whatever parsers of the lines between package blocks look for
+        if self.package is None and "output:" not in line:
+            if self._outside_collecting:
+                return self._feed_outside(line, span)
+            for token in self._outside_tokens:
+                if token in line:
+                    return self._feed_outside(line, span)
+            return []
+        start, end = span if span else (None, None)
+        failures = []
+        match = match_line(line)
+        kind = match.lastgroup if match else None
+        if kind == 'package_start':
+            failures.extend(self._close_package())
+            package = match.group(kind)
+            if self.packages is None or package in self.packages:
+                self._start_package(package, start)
+
+        if self.package is None:
+            return failures
+        failures.extend(self._feed_package_line(line, start, end, match, kind))
+        self._package_end = end
+
+        if kind == 'package_end' and self.package == match.group(kind):
+            failures.extend(self._close_package())
+        return failures
+
+    def feed_buffer(self, buf, offset=0):
+        """
+        Processes a buffer of whole lines of the log and yields the failures they completed.
+
+        Like feed() for every line, with offset the byte offset of the buffer
+        in the log file, except that lines which can't change the result are
+        skipped by byte searches before they are decoded. While no parser is
+        collecting, that is every line between package blocks without
+        "output:" or the tokens of the parsers of those lines, the rest of a
+        package block without failure tokens, and the lines of a package block
+        without trigger tokens. While parsers are collecting, lines without
+        trigger or collect tokens are decoded together and added to their
+        blocks. Where skipping saves little, like in logs of mostly failures,
+        lines are fed without searching for a while.
+        """
+        size = len(buf)
+        trigger_tokens = [token.encode('utf-8') for token in TRIGGER_TOKENS]
+        failure_tokens = [token.encode('utf-8') for token in FAILURE_TOKENS]
+        outside_re = _tokens_re([token.encode('utf-8') for token in self._outside_tokens])
+        trigger_re = _tokens_re(trigger_tokens)
+        extend_re = _tokens_re(trigger_tokens + [token.encode('utf-8') for token in COLLECT_TOKENS])
+        reader = buf if isinstance(buf, mmap.mmap) else io.BytesIO(buf)
+        # Offset of the next line with "output:", where the current package's
+        # block ends at the latest, and of the last failure token before it
+        next_start = -1
+        block = (None, -1, -1)
+        # Whether the line at pos is in a package block and has no trigger
+        # tokens, nor collect tokens while parsers are collecting
+        quiet = False
+        # Bytes skipped or added to blocks at once since stretch_start, or None
+        # while feeding every line, and how many stretches to feed line by
+        # line the next time
+        skipped = 0
+        backoff = 1
+        stretch_start = 0
+        stretch_end = SKIP_STRETCH
+        pos = 0
+        while pos < size:
+            if pos >= stretch_end:
+                if skipped is not None and skipped < SKIP_MIN_SHARE * (pos - stretch_start):
+                    skipped = None
+                    stretch_end = pos + backoff * SKIP_STRETCH
+                    backoff = min(backoff * 2, SKIP_MAX_BACKOFF)
+                else:
+                    if skipped is not None:
+                        backoff = 1
+                    skipped = 0
+                    stretch_end = pos + SKIP_STRETCH
+                stretch_start = pos
+            if skipped is None:
+                reader.seek(pos)
+                for line in iter(reader.readline, b''):
+                    end = pos + len(line)
+                    failures = self.feed(line.decode('utf-8', errors='replace'), (offset + pos, offset + end))
+                    if failures:
+                        yield from failures
+                    pos = end
+                    if pos >= stretch_end:
+                        break
+                quiet = False
+                continue
+            if next_start < pos:
+                next_start = buf.find(b'output:', pos)
+                next_start = _line_start(buf, pos, size if next_start == -1 else next_start)
+            stop = pos
+            if self.package is None:
+                if not self._outside_collecting:
+                    stop = _line_start(buf, pos, _search(outside_re, buf, pos, next_start))
+            elif not self._open_contexts and not self._collecting:
+                if block[0] != self.package or block[1] != next_start:
+                    # A block that goes on in the next buffer may still fail there
+                    last_failure = _find_last(buf, failure_tokens, pos, next_start) if next_start < size else size
+                    block = (self.package, next_start, last_failure)
+                if block[2] < pos:
+                    stop = self._block_end(buf, pos, next_start)
+                elif quiet:
+                    stop = _line_start(buf, pos, _search(trigger_re, buf, pos, next_start))
+                if stop > pos:
+                    self._skip_package_lines(buf, pos, stop, offset)
+            elif not self._open_contexts and quiet:
+                stop = _line_start(buf, pos, _search(extend_re, buf, pos, next_start))
+                if stop > pos:
+                    failures = self._extend_package_lines(buf, pos, stop, offset)
+                    if failures:
+                        yield from failures
+            quiet = False
+            if stop > pos:
+                skipped += stop - pos
+                pos = stop
+                continue
+            # Feed lines until one could be skipped
+            package = self.package
+            reader.seek(pos)
+            for line in iter(reader.readline, b''):
+                if package is not None and not self._open_contexts:
+                    if not (extend_re if self._collecting else trigger_re).search(line):
+                        quiet = True
+                        break
+                end = pos + len(line)
+                failures = self.feed(line.decode('utf-8', errors='replace'), (offset + pos, offset + end))
+                if failures:
+                    yield from failures
+                pos = end
+                if self.package != package or package is None and not self._outside_collecting:
+                    break
+
+    def _block_end(self, buf, pos, next_start):
+        # The block ends at its "Finished <<<" line, or at whatever line may start the next one
+        package = self.package.encode('utf-8')
+        for end_match in PACKAGE_END_BYTES_RE.finditer(buf, pos, next_start):
+            if end_match.group(1) == package:
+                return _line_start(buf, pos, end_match.start())
+        return next_start
+
+    def _skip_package_lines(self, buf, pos, stop, offset):
+        # Only the lines a failure's context could start with are kept
+        spans = []
+        end = stop
+        while end > pos and len(spans) < CONTEXT_BEFORE:
+            start = max(pos, buf.rfind(b'\n', pos, end - 1) + 1)
+            spans.append((start, end))
+            end = start
+        for start, end in reversed(spans):
+            self._recent.append(buf[start:end].decode('utf-8', errors='replace'))
+            self._recent_starts.append(offset + start)
+        self._package_end = offset + stop
+
+    def _extend_package_lines(self, buf, pos, stop, offset):
+        text = buf[pos:stop]
+        if text.isascii():
+            lines = LINE_TEXT_RE.findall(text.decode('ascii'))
+            starts = list(accumulate(map(len, lines), initial=offset + pos))
+        else:
+            raw_lines = LINE_BYTES_RE.findall(text)
+            lines = [line.decode('utf-8', errors='replace') for line in raw_lines]
+            starts = list(accumulate(map(len, raw_lines), initial=offset + pos))
+        end = starts.pop()
+        failures = []
+        for parser in self._collecting:
+            blocks = parser.extend(lines, starts, end)
+            if blocks:
+                failures.extend(self._close_blocks(blocks))
+        self._collecting = [parser for parser in self._collecting if parser.collecting]
+        self._recent.extend(lines[-CONTEXT_BEFORE:])
+        self._recent_starts.extend(starts[-CONTEXT_BEFORE:])
+        self._package_end = end
+        return failures
+
+    def close(self):
+        """
+        Ends the log and returns the failures that were still open.
+        """
+        failures = self._close_package()
+        for parser in self._outside_parsers:
+            failures.extend(self._close_blocks(parser.close()))
+        self._outside_collecting = []
+        return failures
+
+    def _close_package(self):
+        if self.package is None:
+            return []
+        failures = []
+        for parser in self._parsers:
+            failures.extend(self._close_blocks(parser.close()))
+        # Fall back to showing context around failures without a block
+        for context in self._contexts.values():
+            if context is not None:
+                failures.append(context.failure(self.package))
+                self._failed_packages.add(self.package)
+        self.package_spans.append((self.package, self._package_start, self._package_end))
+        self.package = None
+        return failures
+
+    def _close_blocks(self, blocks):
+        failures = []
+        for block in blocks:
+            package = block.package or self.package
+            if self.packages is not None and package not in self.packages:
+                continue
+            if block.fallback and package in self._failed_packages:
+                continue
+            # Drop the "=====" line that introduces the next Unittest failure
+            while block.lines and block.lines[-1].rstrip().endswith("=" * 70):
+                block.lines.pop()
+                # The decoded line may be longer or shorter than it is in the file
+                line_start = block.line_starts.pop()
+                if block.end is not None:
+                    block.end = line_start
+            if self.package is not None:
+                self._contexts[block.test] = None
+            if not block.fallback:
+                self._failed_packages.add(package)
+            failures.append(block.failure(self.package))
+        return failures
+
+    def _feed_outside(self, line, span):
+        start, end = span if span else (None, None)
+        match = LINE_RE.search(line)
+        kind = match.lastgroup if match else None
+        parsers = self._outside_collecting
+        owner = self._outside_owners.get(kind)
+        if owner is not None and owner not in parsers:
+            parsers = parsers + [owner]
+        failures = []
+        for parser in parsers:
+            failures.extend(self._close_blocks(parser.feed(line, start, end, match, kind)))
+        self._outside_collecting = [parser for parser in parsers if parser.collecting]
+        return failures
+
+    def _feed_package_line(self, line, start, end, match, kind):
+        failures = []
+        owner = self._owners.get(kind)
+
+        if self._open_contexts:
+            for context in self._open_contexts:
+                context.append(line, start, end)
+                context.count -= 1
+            self._open_contexts = [c for c in self._open_contexts if c.count > 0]
+        if owner is not None and kind in owner.failure_kinds:
+            test = owner.failed_test(match, line)
+            if test is not None and test not in self._contexts:
+                context_start = self._recent_starts[0] if self._recent_starts else start
+                context = _Block(
+                    test, self._recent, context_start, owner.framework, self._recent_starts)
+                context.append(line, start, end)
+                context.count = CONTEXT_AFTER - 1
+                context.isolated = False
+                self._contexts[test] = context
+                self._open_contexts.append(context)
+
+        parsers = self._collecting
+        if owner is not None and owner not in parsers:
+            parsers = parsers + [owner]
+        if parsers:
+            changed = parsers is not self._collecting
+            for parser in parsers:
+                blocks = parser.feed(line, start, end, match, kind)
+                if blocks:
+                    failures.extend(self._close_blocks(blocks))
+                if not parser.collecting:
+                    changed = True
+            if changed:
+                self._collecting = [parser for parser in parsers if parser.collecting]
+
+        self._recent.append(line)
+        self._recent_starts.append(start)
+        return failures
+
+
+def iter_failures(lines, packages=None):
+    """
+    Yields each failed test in a log as soon as its output block is complete.
+    """
+    extractor = FailureExtractor(packages)
+    for line in lines:
+        yield from extractor.feed(line)
+    yield from extractor.close()
+
+
+def normalize_failure_output(failure):
+    """
+    Strips what differs between occurrences of the same failure from its output.
+
+    Addresses, timestamps, temporary paths, line numbers, durations and the
+    name of the failed test itself are replaced by placeholders.
+    """
+    output = failure.output.replace(failure.test, 'TEST')
+    for pattern, replacement in FINGERPRINT_SUBSTITUTIONS:
+        output = pattern.sub(replacement, output)
+    return output.strip()
+
+
+def failure_fingerprint(failure):
+    """
+    Returns a short hash that is the same for failures with the same normalized output.
+    """
+    normalized = normalize_failure_output(failure).encode('utf-8')
+    return hashlib.blake2b(normalized, digest_size=8).hexdigest()
+
+
+def cluster_failures(failures):
+    """
+    Groups failures by fingerprint, largest group first.
+
+    Each cluster is a dict with the fingerprint, the first failure with it as
+    the representative, and the (package, test) of every failure in it.
+    """
+    clusters = {}
+    for failure in failures:
+        fingerprint = failure_fingerprint(failure)
+        if fingerprint not in clusters:
+            clusters[fingerprint] = {
+                'fingerprint': fingerprint,
+                'representative': failure,
+                'tests': [],
+            }
+        clusters[fingerprint]['tests'].append((failure.package, failure.test))
+    return sorted(clusters.values(), key=lambda cluster: -len(cluster['tests']))
+
+
+def iter_log_lines(path, packages=None):
+    """
+    Yields the decoded lines of a log file, or of stdin if the path is '-'.
+
+    Plain files are memory-mapped and gzip or xz compressed files are
+    decompressed while they are read. If packages are given, only the output
+    blocks of those packages are decoded and the rest of the log is skipped.
+    """
+    if path == '-':
+        lines = sys.stdin.buffer
+        if packages is not None:
+            lines = _select_package_lines(lines, packages)
+        for line in lines:
+            yield line.decode('utf-8', errors='replace')
+        return
+
+    with open(path, 'rb') as f, _open_log_stream(f) as stream:
+        if packages is None:
+            lines = iter(stream.readline, b'')
+        elif isinstance(stream, mmap.mmap):
+            lines = _select_mapped_package_lines(stream, packages)
+        else:
+            lines = _select_package_lines(stream, packages)
+        for line in lines:
+            yield line.decode('utf-8', errors='replace')
+
+
+def iter_log_buffers(path):
+    """
+    Yields (offset, buffer) pairs of whole lines of a log file, or of stdin if the path is '-'.
+
+    A plain file is one memory-mapped buffer. Compressed files and stdin are
+    read in chunks, each cut after its last complete line.
+    """
+    if path == '-':
+        yield from _iter_read_buffers(sys.stdin.buffer.read1)
+        return
+    with open(path, 'rb') as f, _open_log_stream(f) as stream:
+        if isinstance(stream, mmap.mmap):
+            yield 0, stream
+        else:
+            yield from _iter_read_buffers(stream.read)
+
+
+def _iter_read_buffers(read):
+    offset = 0
+    partial = b''
+    while True:
+        chunk = read(READ_CHUNK_SIZE)
+        if not chunk:
+            break
+        buf = partial + chunk
+        cut = buf.rfind(b'\n') + 1
+        if cut:
+            yield offset, buf[:cut]
+            offset += cut
+        partial = buf[cut:]
+    if partial:
+        yield offset, partial
+
+
+def iter_log_failures(path, packages=None):
+    """
+    Yields each failed test in a log file, or stdin if the path is '-', as soon as its output block is complete.
+
+    With packages only their blocks are read, as by iter_log_lines().
+    Otherwise the log is fed to the extractor a buffer at a time, which skips
+    most lines undecoded, and failures have the span of their output.
+    """
+    if packages is not None:
+        yield from iter_failures(iter_log_lines(path, packages), packages)
+        return
+    extractor = FailureExtractor()
+    for offset, buf in iter_log_buffers(path):
+        yield from extractor.feed_buffer(buf, offset)
+    yield from extractor.close()
+
+
+@contextmanager
+def _open_log_stream(f):
+    """
+    Provides a seekable binary stream of the decompressed content of an open log file.
+    """
+    magic = f.read(len(XZ_MAGIC))
+    f.seek(0)
+    if magic.startswith(GZIP_MAGIC):
+        with gzip.open(f) as stream:
+            yield stream
+    elif magic == XZ_MAGIC:
+        with lzma.open(f) as stream:
+            yield stream
+    elif magic:
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            yield mm
+    else:
+        # Empty files can't be memory-mapped
+        yield io.BytesIO()
+
+
+def _select_package_lines(lines, packages):
+    """
+    Yields the lines of the output blocks of the given packages.
+    """
+    lines = iter(lines)
+    wanted = {p.encode('utf-8') for p in packages}
+    for line in lines:
+        if b'output:' not in line:
             continue
-        m1 = gtest_re.search(line)
-        if m1 and "ms)" not in m1.group(1):
-            failed_tests.add(m1.group(1))
-            
-        m2 = unittest_re.search(line)
-        if m2:
-            failed_tests.add(m2.group(1))
-            
-        m3 = pytest_summary_re.search(line)
-        if m3:
-            failed_tests.add(m3.group(1))
-            
-    return sorted(list(failed_tests))
-
-def extract_failed_test_output(log_lines, test_name):
-    """
-    Attempts to extract the specific block of log output related to a failed test.
-    """
-    output = []
-    capturing = False
-    
-    # Markers for GTest and Unittest output blocks
-    gtest_start = f"[ RUN      ] {test_name}"
-    gtest_end = f"[  FAILED  ] {test_name}"
-    
-    unit_start = f"FAIL: {test_name}"
-    unit_error_start = f"ERROR: {test_name}"
-    pytest_start = f"_{test_name}_"  # Pytest usually underlines the test name
-    
-    unit_end = "----------------------------------------------------------------------"
-    
-    dashed_line_count = 0
-    
-    for line in log_lines:
-        if gtest_start in line or unit_start in line or unit_error_start in line or pytest_start in line:
-            capturing = True
-            dashed_line_count = 0
-            
-        if capturing:
-            output.append(line)
-            
-        if capturing:
-            if gtest_end in line:
-                capturing = False
-            elif unit_end in line:
-                dashed_line_count += 1
-                # Unittest tracebacks usually end with a second dashed line
-                if dashed_line_count >= 2:
-                    capturing = False
-                    
-    return "".join(output)
+        start_match = PACKAGE_START_BYTES_RE.search(line)
+        if start_match and start_match.group(1) in wanted:
+            yield from _package_block_lines(line, start_match.group(1), lines, wanted)
+
+
+def _select_mapped_package_lines(mm, packages):
+    """
+    Like _select_package_lines(), but jumps straight to the blocks in a memory-mapped log.
+    """
+    wanted = {p.encode('utf-8') for p in packages}
+    pos = 0
+    while True:
+        start_match = PACKAGE_START_BYTES_RE.search(mm, pos)
+        if start_match is None:
+            return
+        if start_match.group(1) not in wanted:
+            pos = start_match.end()
+            continue
+        mm.seek(mm.rfind(b'\n', 0, start_match.start()) + 1)
+        lines = iter(mm.readline, b'')
+        yield from _package_block_lines(next(lines), start_match.group(1), lines, wanted)
+        pos = mm.tell()
+
+
+def _package_block_lines(first_line, package, lines, wanted):
+    """
+    Yields lines from the start of a package block up to and including its end.
+
+    A block ends at its "Finished <<<" line, or at the start of the block of a
+    package that is not wanted. The start of a wanted package's block
+    continues with that package instead.
+    """
+    yield first_line
+    for line in lines:
+        yield line
+        if b'output:' in line:
+            start_match = PACKAGE_START_BYTES_RE.search(line)
+            if start_match:
+                if start_match.group(1) not in wanted:
+                    return
+                package = start_match.group(1)
+        if b'Finished <<<' in line:
+            end_match = PACKAGE_END_BYTES_RE.search(line)
+            if end_match and end_match.group(1) == package:
+                return
+
+
+def follow_failures(lines, packages=None):
+    """
+    Yields the failures of each package of a growing log as soon as its package block ends.
+
+    Lines are read until the log ends or Jenkins reports that the build finished.
+    """
+    extractor = FailureExtractor(packages)
+    pending = defaultdict(list)
+    for line in lines:
+        package = extractor.package
+        for failure in extractor.feed(line):
+            if failure.package in (package, extractor.package):
+                pending[failure.package].append(failure)
+            else:
+                # Found outside of package blocks, e.g. by "colcon test-result"
+                yield failure
+        if package is not None and extractor.package != package:
+            yield from pending.pop(package, [])
+        if JENKINS_FINISHED_RE.match(line):
+            break
+    for failure in extractor.close():
+        pending[failure.package].append(failure)
+    for failures in pending.values():
+        yield from failures
+
+
+def iter_chunk_lines(chunks):
+    """
+    Splits chunks of a log into decoded lines, holding back a partial last line until it is complete.
+    """
+    partial = b''
+    for chunk in chunks:
+        lines = (partial + chunk).split(b'\n')
+        partial = lines.pop()
+        for line in lines:
+            yield (line + b'\n').decode('utf-8', errors='replace')
+    if partial:
+        yield partial.decode('utf-8', errors='replace')
+
+
+def iter_file_chunks(path, poll_interval):
+    """
+    Yields what is appended to a log file, checking for more every poll_interval seconds.
+
+    Only what was appended since the previous read is read, so this never
+    ends on its own.
+    """
+    with open(path, 'rb') as f:
+        while True:
+            chunk = f.read(FOLLOW_CHUNK_SIZE)
+            if chunk:
+                yield chunk
+            else:
+                time.sleep(poll_interval)
+
+
+def progressive_text_url(build_url):
+    """
+    Makes the progressiveText URL of a Jenkins build URL.
+    """
+    # from: https://ci.ros2.org/job/nightly_linux_release/2227/
+    # to: https://ci.ros2.org/job/nightly_linux_release/2227/logText/progressiveText
+    build_url = build_url.rstrip('/')
+    if build_url.endswith('/progressiveText'):
+        return build_url
+    return f'{build_url}/logText/progressiveText'
+
+
+def iter_progressive_text_chunks(build_url, poll_interval):
+    """
+    Yields the console log of a running Jenkins build as it grows.
+
+    The build's progressiveText endpoint is polled every poll_interval seconds,
+    each time from the byte offset Jenkins returned in X-Text-Size, until
+    X-More-Data says the log is complete.
+    """
+    # Only needed for following Jenkins builds
+    import requests
+
+    url = progressive_text_url(build_url)
+    start = 0
+    with requests.Session() as session:
+        while True:
+            response = session.get(url, params={'start': start})
+            if not response.ok:
+                raise RuntimeError(f'{response.status_code}: {response.reason} when accessing {url}')
+            if response.content:
+                yield response.content
+            start = int(response.headers.get('X-Text-Size', start + len(response.content)))
+            if response.headers.get('X-More-Data', '').lower() != 'true':
+                return
+            time.sleep(poll_interval)
+
+
+def index_path(path):
+    """
+    Returns the path of the sidecar index of a log file, a hidden file next to it.
+    """
+    directory, name = os.path.split(path)
+    return os.path.join(directory, f".{name}.failed_tests_index.json")
+
+
+def load_index(path):
+    """
+    Returns the sidecar index of a log file, or None if there is none or the log changed since.
+    """
+    try:
+        with open(index_path(path), encoding='utf-8') as f:
+            index = json.load(f)
+        stat = os.stat(path)
+    except (OSError, ValueError):
+        return None
+    if (
+        not isinstance(index, dict)
+        or index.get('version') != INDEX_VERSION
+        or index.get('size') != stat.st_size
+        or index.get('mtime_ns') != stat.st_mtime_ns
+    ):
+        return None
+    return index
+
+
+def build_index(path, on_failure=None):
+    """
+    Scans a whole log file once, writes its sidecar index, and returns the index.
+
+    The index records the byte offsets of every package block and of the
+    output of every failure, and is keyed by the size and mtime of the log.
+    on_failure is called with every failure as soon as it is found.
+    """
+    stat = os.stat(path)
+    extractor = FailureExtractor()
+    failures = []
+
+    def found(new_failures):
+        for failure in new_failures:
+            failures.append({
+                'package': failure.package,
+                'test': failure.test,
+                'isolated': failure.isolated,
+                'framework': failure.framework,
+                'start': failure.span[0],
+                'end': failure.span[1],
+            })
+            if on_failure is not None:
+                on_failure(failure)
+
+    for offset, buf in iter_log_buffers(path):
+        found(extractor.feed_buffer(buf, offset))
+    found(extractor.close())
+
+    index = {
+        'version': INDEX_VERSION,
+        'size': stat.st_size,
+        'mtime_ns': stat.st_mtime_ns,
+        'packages': [
+            {'package': pkg, 'start': start, 'end': end}
+            for pkg, start, end in extractor.package_spans
+        ],
+        'failures': failures,
+    }
+    tmp_path = index_path(path) + '.tmp'
+    try:
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(index, f)
+        os.replace(tmp_path, index_path(path))
+    except OSError:
+        # The log may be in a read-only directory, which only costs speed
+        pass
+    return index
+
+
+def iter_indexed_failures(path, index, packages=None, read_output=True):
+    """
+    Yields the failures recorded in the index of a log file.
+
+    Only the bytes of the failures' output are read from the log, and nothing
+    at all if read_output is False, in which case the output is None.
+    """
+    entries = [
+        entry for entry in index['failures']
+        if packages is None or entry['package'] in packages
+    ]
+    outputs = {}
+    if read_output and entries:
+        with open(path, 'rb') as f, _open_log_stream(f) as stream:
+            # Read in file order so compressed logs are only decompressed forwards
+            for i in sorted(range(len(entries)), key=lambda i: entries[i]['start']):
+                stream.seek(entries[i]['start'])
+                data = stream.read(entries[i]['end'] - entries[i]['start'])
+                outputs[i] = data.decode('utf-8', errors='replace')
+    for i, entry in enumerate(entries):
+        yield Failure(
+            entry['package'], entry['test'], outputs.get(i), entry['isolated'],
+            (entry['start'], entry['end']), entry['framework'])
+
+
+def build_name(path):
+    """
+    Returns the name of the build a log file is from, e.g. "<job>_<number>" for fetch_job_logs.py output.
+    """
+    name = os.path.basename(path)
+    while name.endswith(LOG_SUFFIXES):
+        name = os.path.splitext(name)[0]
+    return name
+
+
+def _build_sort_key(build):
+    # Order "<job>_<number>" builds by job, then numerically by build number
+    match = re.match(r'(.*)_(\d+)$', build)
+    if match:
+        return (match.group(1), int(match.group(2)), build)
+    return (build, -1, build)
+
+
+def summarize_log(path, packages=None, use_index=True, cluster=False):
+    """
+    Scans a log file for the packages it ran and the names of their failed tests.
+
+    With use_index the summary comes from the sidecar index of the log, which
+    is built first if it is missing or out of date, unless only some packages
+    are summarized. With cluster the summary
+    also has the log's failures clustered by fingerprint, each cluster with
+    the output of its representative failure.
+    """
+    failed_tests = defaultdict(set)
+    failures = []
+
+    def add(failure):
+        failed_tests[failure.package].add(failure.test)
+        if cluster:
+            failures.append(failure)
+
+    index = None
+    if use_index:
+        index = load_index(path)
+        if index is None and packages is None:
+            index = build_index(path)
+    if index is not None:
+        packages_seen = {
+            entry['package'] for entry in index['packages']
+            if packages is None or entry['package'] in packages
+        }
+        for failure in iter_indexed_failures(path, index, packages, read_output=cluster):
+            add(failure)
+    else:
+        extractor = FailureExtractor(packages)
+        if packages is None:
+            failures_found = (
+                failure for offset, buf in iter_log_buffers(path)
+                for failure in extractor.feed_buffer(buf, offset))
+        else:
+            failures_found = (
+                failure for line in iter_log_lines(path, packages)
+                for failure in extractor.feed(line))
+        for failure in failures_found:
+            add(failure)
+        for failure in extractor.close():
+            add(failure)
+        packages_seen = extractor.packages_seen
+    clusters = None
+    if cluster:
+        clusters = [
+            {
+                'fingerprint': c['fingerprint'],
+                'package': c['representative'].package,
+                'test': c['representative'].test,
+                'output': c['representative'].output.strip(),
+                'tests': c['tests'],
+            }
+            for c in cluster_failures(failures)
+        ]
+    return LogSummary(
+        build_name(path),
+        sorted(packages_seen),
+        {pkg: sorted(tests) for pkg, tests in failed_tests.items()},
+        clusters,
+    )
+
+
+def summarize_logs(directory, packages=None, jobs=None, use_index=True, cluster=False):
+    """
+    Scans every log file in a directory with a pool of processes, one log per worker at a time.
+    """
+    paths = sorted(
+        entry.path
+        for entry in os.scandir(directory)
+        if entry.is_file() and not entry.name.startswith('.')
+    )
+    with ProcessPoolExecutor(max_workers=jobs) as executor:
+        summaries = list(executor.map(
+            summarize_log, paths, [packages] * len(paths), [use_index] * len(paths),
+            [cluster] * len(paths)))
+    return sorted(summaries, key=lambda summary: _build_sort_key(summary.build))
+
+
+def failure_matrix(summaries):
+    """
+    Aggregates log summaries into failure rates per package and per test across builds.
+
+    A package or test's rate is the number of builds it failed in divided by
+    the number of builds that ran the package.
+    """
+    builds = [summary.build for summary in summaries]
+    runs = defaultdict(list)
+    failed_builds = defaultdict(lambda: defaultdict(list))
+    for summary in summaries:
+        for pkg in summary.packages:
+            runs[pkg].append(summary.build)
+        for pkg, tests in summary.failed_tests.items():
+            for test in tests:
+                failed_builds[pkg][test].append(summary.build)
+
+    packages = {}
+    for pkg in sorted(failed_builds):
+        tests = failed_builds[pkg]
+        num_runs = len(runs[pkg])
+        pkg_failures = len({build for test_builds in tests.values() for build in test_builds})
+        packages[pkg] = {
+            'runs': num_runs,
+            'failures': pkg_failures,
+            'failure_rate': pkg_failures / num_runs if num_runs else 0.0,
+            'builds': runs[pkg],
+            'tests': {
+                test: {
+                    'runs': num_runs,
+                    'failures': len(tests[test]),
+                    'failure_rate': len(tests[test]) / num_runs if num_runs else 0.0,
+                    'failed_builds': tests[test],
+                }
+                for test in sorted(tests)
+            },
+        }
+    return {'builds': builds, 'packages': packages}
+
+
+def write_matrix_csv(matrix, f):
+    """
+    Writes a failure matrix as CSV with a column per build.
+
+    Each package has a row with an empty test column, followed by a row per
+    failed test. Cells are 1 if the package or test failed in a build, 0 if
+    the build ran the package without it failing, and empty otherwise.
+    """
+    writer = csv.writer(f)
+    writer.writerow(['package', 'test', 'runs', 'failures', 'failure_rate', *matrix['builds']])
+    for pkg, pkg_stats in matrix['packages'].items():
+        ran = set(pkg_stats['builds'])
+        pkg_failed = {b for t in pkg_stats['tests'].values() for b in t['failed_builds']}
+        rows = [('', pkg_stats, pkg_failed)]
+        rows += [(test, stats, set(stats['failed_builds'])) for test, stats in pkg_stats['tests'].items()]
+        for test, stats, failed in rows:
+            cells = [
+                '1' if build in failed else '0' if build in ran else ''
+                for build in matrix['builds']
+            ]
+            writer.writerow([
+                pkg, test, stats['runs'], stats['failures'], f"{stats['failure_rate']:.3f}", *cells])
+
+
+def merge_clusters(summaries):
+    """
+    Merges the failure clusters of log summaries by fingerprint, largest cluster first.
+
+    The representative of a cluster is its first failure in the earliest
+    build that has it.
+    """
+    clusters = {}
+    for summary in summaries:
+        for log_cluster in summary.clusters:
+            fingerprint = log_cluster['fingerprint']
+            if fingerprint not in clusters:
+                clusters[fingerprint] = {
+                    'fingerprint': fingerprint,
+                    'failures': 0,
+                    'builds': [],
+                    'tests': defaultdict(list),
+                    'representative': {
+                        'build': summary.build,
+                        'package': log_cluster['package'],
+                        'test': log_cluster['test'],
+                        'output': log_cluster['output'],
+                    },
+                }
+            merged = clusters[fingerprint]
+            merged['failures'] += len(log_cluster['tests'])
+            merged['builds'].append(summary.build)
+            for pkg, test in log_cluster['tests']:
+                merged['tests'][(pkg, test)].append(summary.build)
+    for merged in clusters.values():
+        merged['tests'] = [
+            {'package': pkg, 'test': test, 'builds': builds}
+            for (pkg, test), builds in merged['tests'].items()
+        ]
+    return sorted(clusters.values(), key=lambda merged: -merged['failures'])
+
+
+def write_clusters_csv(clusters, f):
+    """
+    Writes merged failure clusters as CSV with a row per cluster.
+
+    Affected tests are joined as "package: test" with "; " between them.
+    """
+    writer = csv.writer(f)
+    writer.writerow(['fingerprint', 'failures', 'builds', 'tests', 'package', 'test', 'output'])
+    for merged in clusters:
+        representative = merged['representative']
+        writer.writerow([
+            merged['fingerprint'],
+            merged['failures'],
+            len(merged['builds']),
+            '; '.join(f"{t['package']}: {t['test']}" for t in merged['tests']),
+            representative['package'],
+            representative['test'],
+            representative['output'],
+        ])
+
+
+def failure_record(log, failure):
+    """
+    Returns a failure found in a log as a dict for JSON output.
+
+    The start and end byte offsets of the output in the log are None if
+    unknown, e.g. when only some packages were read without the index, and
+    so is the output if it wasn't read.
+    """
+    start, end = failure.span if failure.span else (None, None)
+    return {
+        'log': log,
+        'package': failure.package,
+        'test': failure.test,
+        'framework': failure.framework,
+        'isolated': failure.isolated,
+        'start': start,
+        'end': end,
+        'output': failure.output,
+    }
+
+
+def xml_text(value):
+    """
+    Drops the characters XML can't contain, such as the ANSI escapes of colored output.
+    """
+    return XML_INVALID_CHARS_RE.sub('', str(value)) if value is not None else ''
+
+
+def write_junit_xml(failures, f):
+    """
+    Writes (log, failure) pairs as JUnit XML, with a test suite per package of each log.
+
+    Only failed tests are known, so every test case in it failed.
+    """
+    suites = defaultdict(list)
+    for log, failure in failures:
+        suites[(log, failure.package)].append(failure)
+    root = ET.Element('testsuites', tests=str(len(failures)), failures=str(len(failures)))
+    for (log, package), suite_failures in suites.items():
+        suite = ET.SubElement(
+            root, 'testsuite', name=xml_text(package), tests=str(len(suite_failures)),
+            failures=str(len(suite_failures)), errors='0')
+        properties = ET.SubElement(suite, 'properties')
+        ET.SubElement(properties, 'property', name='log', value=xml_text(log))
+        for failure in suite_failures:
+            case = ET.SubElement(
+                suite, 'testcase', classname=xml_text(package), name=xml_text(failure.test))
+            element = ET.SubElement(
+                case, 'failure', message=xml_text(f"{failure.test} failed"),
+                type=xml_text(failure.framework))
+            if failure.output is not None:
+                element.text = xml_text(failure.output.strip())
+    ET.indent(root)
+    f.write('<?xml version="1.0" encoding="UTF-8"?>\n')
+    f.write(ET.tostring(root, encoding='unicode'))
+    f.write('\n')
+
+
+def package_list(value):
+    """
+    Splits a comma separated --packages value.
+    """
+    return [package for package in value.split(',') if package]
+
+
+def is_log_argument(value):
+    """
+    Tells whether a command line argument names a log rather than a package.
+    """
+    return value == '-' or value.startswith(('http://', 'https://')) or os.path.isfile(value)
+
 
 def main():
     parser = argparse.ArgumentParser(description="Extract failed tests from CI log files")
     parser.add_argument('--names-only', action='store_true', help="Show just failed test names")
-    parser.add_argument('--packages', nargs='+', help="Show just failed tests from given packages")
+    parser.add_argument(
+        '--packages', nargs='+', type=package_list, action='extend', metavar='PKG[,PKG...]',
+        help="Show just failed tests from given space or comma separated packages, may be repeated")
+    parser.add_argument(
+        'logs', nargs='*',
+        help="Log files to read, plain or gzip/xz compressed (default: stdin)")
+    parser.add_argument(
+        '--batch', metavar='DIR',
+        help="Scan every log in a directory, e.g. from fetch_job_logs.py, and print "
+             "a test x build failure matrix instead")
+    parser.add_argument(
+        '--format', choices=['text', 'jsonl', 'junit', 'csv', 'json'],
+        help="Output format: text, JSON lines with a failure per line, or JUnit XML for logs "
+             "(default: text), and csv or json for --batch (default: csv)")
+    parser.add_argument(
+        '--jobs', '-j', type=int, default=None,
+        help="Number of logs --batch scans in parallel (default: number of CPUs)")
+    parser.add_argument(
+        '--cluster', action='store_true',
+        help="Group failures with the same output, ignoring addresses, timestamps, temporary "
+             "paths and line numbers, and show one representative per group with its counts")
+    parser.add_argument(
+        '--follow', '-f', action='store_true',
+        help="Follow a growing log file, or the URL of a running Jenkins build, and show "
+             "the failed tests of each package as soon as the package finishes")
+    parser.add_argument(
+        '--poll-interval', type=float, default=5.0,
+        help="Seconds between checks for more output with --follow (default: 5)")
+    parser.add_argument(
+        '--no-index', action='store_true',
+        help="Don't use or write the hidden sidecar index that makes rereading log files fast")
     args = parser.parse_args()
+    if args.packages:
+        args.packages = [package for value in args.packages for package in value]
+        # nargs='+' also takes the log files that follow the packages
+        while args.packages and is_log_argument(args.packages[-1]):
+            args.logs.insert(0, args.packages.pop())
+        for package in args.packages:
+            # Package names can't have these, but paths of logs that don't exist can
+            if '.' in package or '/' in package:
+                parser.error(f"{package} is neither a package nor an existing log file")
+    args.logs = args.logs or ['-']
+    if args.logs == ['-'] and not args.batch and sys.stdin.isatty():
+        parser.error("no log files given and stdin is a terminal")
+    if args.batch:
+        args.format = args.format or 'csv'
+        if args.format not in ('csv', 'json'):
+            parser.error("--batch writes csv or json")
+    else:
+        args.format = args.format or 'text'
+        if args.format not in ('text', 'jsonl', 'junit'):
+            parser.error("logs are written as text, jsonl or junit")
+        if args.cluster and args.format != 'text':
+            parser.error("--cluster writes text")
 
-    # 1. Read all input from stdin
-    lines = sys.stdin.readlines()
-    
-    # 2. Isolate the logs by package using the specified regex boundaries
-    pkg_logs = extract_package_logs(lines)
-    
-    # 3. Filter to the specified packages if requested
-    packages_to_check = args.packages if args.packages else pkg_logs.keys()
-    
-    for pkg in packages_to_check:
-        if pkg not in pkg_logs:
-            continue
-            
-        log = pkg_logs[pkg]
-        failed_tests = find_failed_tests(log)
-        
-        if not failed_tests:
-            continue
-            
+    if args.batch:
+        summaries = summarize_logs(
+            args.batch, args.packages, args.jobs, not args.no_index, args.cluster)
+        if args.cluster:
+            clusters = merge_clusters(summaries)
+            if args.format == 'json':
+                json.dump({
+                    'builds': [summary.build for summary in summaries],
+                    'clusters': clusters,
+                }, sys.stdout, indent=2)
+                print()
+            else:
+                write_clusters_csv(clusters, sys.stdout)
+            return
+        matrix = failure_matrix(summaries)
+        if args.format == 'json':
+            json.dump(matrix, sys.stdout, indent=2)
+            print()
+        else:
+            write_matrix_csv(matrix, sys.stdout)
+        return
+
+    shown = set()
+    log = None
+
+    def show(failure):
         if args.names_only:
-            for t in failed_tests:
-                print(f"{pkg}: {t}")
+            if (failure.package, failure.test) not in shown:
+                shown.add((failure.package, failure.test))
+                print(f"{failure.package}: {failure.test}")
+            return
+
+        print(f"=== Failed Test: {failure.test} (Package: {failure.package}) ===")
+        if not failure.isolated:
+            # Exact parsing failed, so this is the context around the failure
+            print(f"Could not isolate exact test log block. Here is the failure context:")
+        print(failure.output.strip())
+        print("\n" + "=" * 80 + "\n")
+
+    def write_json_line(failure):
+        print(json.dumps(failure_record(log, failure)))
+
+    failures = []
+
+    def collect(failure):
+        failures.append((log, failure))
+
+    if args.cluster or args.format == 'junit':
+        output = collect
+    elif args.format == 'jsonl':
+        output = write_json_line
+    else:
+        output = show
+
+    def handle(failure):
+        if not args.packages or failure.package in args.packages:
+            output(failure)
+
+    if args.follow:
+        if len(args.logs) != 1:
+            parser.error("--follow takes exactly one log file or Jenkins build URL")
+        path = log = args.logs[0]
+        if path.startswith(('http://', 'https://')):
+            lines = iter_chunk_lines(iter_progressive_text_chunks(path, args.poll_interval))
+        elif path == '-':
+            lines = (line.decode('utf-8', errors='replace') for line in sys.stdin.buffer)
         else:
-            for t in failed_tests:
-                print(f"=== Failed Test: {t} (Package: {pkg}) ===")
-                ext_log = extract_failed_test_output(log, t)
-                
-                if ext_log:
-                    print(ext_log.strip())
-                else:
-                    # Fallback to showing context around the failure if exact parsing fails
-                    print(f"Could not isolate exact test log block. Here is the failure context:")
-                    for i, line in enumerate(log):
-                        if t in line and ("FAIL" in line or "ERROR" in line):
-                            start = max(0, i - 5)
-                            end = min(len(log), i + 15)
-                            print("".join(log[start:end]).strip())
-                            break
-                print("\n" + "=" * 80 + "\n")
+            lines = iter_chunk_lines(iter_file_chunks(path, args.poll_interval))
+        try:
+            for failure in follow_failures(lines, args.packages):
+                handle(failure)
+                sys.stdout.flush()
+        except KeyboardInterrupt:
+            pass
+    else:
+        for path in args.logs:
+            log = path
+            index = None if path == '-' or args.no_index else load_index(path)
+            if index is None and (path == '-' or args.no_index or args.packages):
+                # Jumping to the blocks of a few packages is cheaper than indexing the whole log
+                for failure in iter_log_failures(path, args.packages):
+                    handle(failure)
+                continue
+            if index is None:
+                # The first read of a log scans all of it to build the index
+                build_index(path, on_failure=handle)
+                continue
+            for failure in iter_indexed_failures(
+                    path, index, args.packages, read_output=args.cluster or not args.names_only):
+                handle(failure)
+
+    if args.format == 'junit':
+        write_junit_xml(failures, sys.stdout)
+        return
+
+    for cluster in cluster_failures(failure for _, failure in failures):
+        tests = cluster['tests']
+        representative = cluster['representative']
+        print(f"=== {len(tests)} failure(s) with fingerprint {cluster['fingerprint']} ===")
+        for pkg, test in tests:
+            print(f"{pkg}: {test}")
+        if args.names_only:
+            print()
+            continue
+        print(f"--- Representative: {representative.test} (Package: {representative.package}) ---")
+        if not representative.isolated:
+            print(f"Could not isolate exact test log block. Here is the failure context:")
+        print(representative.output.strip())
+        print("\n" + "=" * 80 + "\n")
 
 if __name__ == '__main__':
-    main()
\ No newline at end of file
+    main()
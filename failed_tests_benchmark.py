@@ -0,0 +1,225 @@
+#!/usr/bin/env python3
+"""Benchmark the line matching of failed_tests.py on a CI log.
+
+The log is read into memory first, so only matching is timed. Every stage
+reports lines per second:
+  * prefilter: only the trigger token checks of failed_tests.match_line()
+  * combined pattern: failed_tests.LINE_RE on every line, without prefilter
+  * match_line: prefilter followed by the combined pattern on the survivors
+  * separate patterns: one regex search per pattern on every line, which is
+    how failed_tests.py used to match lines
+  * baseline extraction: the names and output of the failed tests found the
+    way failed_tests.py used to, end to end
+  * extraction: failed_tests.iter_failures() over the whole log
+  * buffer extraction: failed_tests.FailureExtractor.feed_buffer() over the
+    whole log encoded again, which is how log files are read
+"""
+
+import argparse
+from itertools import islice
+import json
+import re
+import sys
+import time
+
+import failed_tests
+
+# The patterns failed_tests.py used to search every line for, one by one
+SEPARATE_PATTERNS = [
+    re.compile(r'---\s*output:\s+([^\s]+)'),
+    re.compile(r'Finished <<<\s+([^\s]+)'),
+    re.compile(r'\[\s*FAILED\s*\]\s+([^\s]+)'),
+    re.compile(r'^(?:\d+:\s+)?(?:FAIL|ERROR):\s+([^\s]+)'),
+    re.compile(r'FAILED\s+.*::([^\s]+)'),
+]
+
+
+def _baseline_test_output(log: list[str], test: str) -> str:
+    """Return the output of a failed test in a package's lines as failed_tests.py used to."""
+    gtest_start = f"[ RUN      ] {test}"
+    gtest_end = f"[  FAILED  ] {test}"
+    unittest_start = f"FAIL: {test}"
+    unittest_error_start = f"ERROR: {test}"
+    pytest_start = f"_{test}_"
+    unittest_end = "-" * 70
+    output = []
+    capturing = False
+    dashed_lines = 0
+    for line in log:
+        if gtest_start in line or unittest_start in line or unittest_error_start in line or pytest_start in line:
+            capturing = True
+            dashed_lines = 0
+        if capturing:
+            output.append(line)
+            if gtest_end in line:
+                capturing = False
+            elif unittest_end in line:
+                dashed_lines += 1
+                if dashed_lines >= 2:
+                    capturing = False
+    if output:
+        return "".join(output)
+    # The context around the failure
+    for i, line in enumerate(log):
+        if test in line and ("FAIL" in line or "ERROR" in line):
+            return "".join(log[max(0, i - 5):i + 15])
+    return ""
+
+
+def _prefilter(lines: list[str]) -> int:
+    survivors = 0
+    for line in lines:
+        for token in failed_tests.TRIGGER_TOKENS:
+            if token in line:
+                survivors += 1
+                break
+    return survivors
+
+
+def _combined_pattern(lines: list[str]) -> int:
+    search = failed_tests.LINE_RE.search
+    return sum(1 for line in lines if search(line))
+
+
+def _match_line(lines: list[str]) -> int:
+    match_line = failed_tests.match_line
+    return sum(1 for line in lines if match_line(line))
+
+
+def _separate_patterns(lines: list[str]) -> int:
+    matches = 0
+    for line in lines:
+        for pattern in SEPARATE_PATTERNS:
+            if pattern.search(line):
+                matches += 1
+    return matches
+
+
+def _baseline_extraction(lines: list[str]) -> int:
+    start_re, end_re, gtest_re, unittest_re, pytest_re = SEPARATE_PATTERNS
+    # Every package block is gathered first, then searched for failed tests
+    package_logs = {}
+    package = None
+    for line in lines:
+        start = start_re.search(line)
+        if start:
+            package = start.group(1)
+            package_logs[package] = []
+        if package:
+            package_logs[package].append(line)
+        end = end_re.search(line)
+        if end and package == end.group(1):
+            package = None
+
+    failures = 0
+    for log in package_logs.values():
+        tests = set()
+        for line in log:
+            if "listed below" in line:
+                continue
+            gtest = gtest_re.search(line)
+            if gtest and "ms)" not in gtest.group(1):
+                tests.add(gtest.group(1))
+            unittest = unittest_re.search(line)
+            if unittest:
+                tests.add(unittest.group(1))
+            pytest = pytest_re.search(line)
+            if pytest:
+                tests.add(pytest.group(1))
+        for test in sorted(tests):
+            _baseline_test_output(log, test)
+            failures += 1
+    return failures
+
+
+def _extraction(lines: list[str]) -> int:
+    return sum(1 for _ in failed_tests.iter_failures(lines))
+
+
+def _buffer_extraction(lines: list[str]) -> int:
+    extractor = failed_tests.FailureExtractor()
+    failures = sum(1 for _ in extractor.feed_buffer("".join(lines).encode("utf-8")))
+    return failures + len(extractor.close())
+
+
+def run_benchmark(lines: list[str], repeat: int) -> dict:
+    """Time every stage on the given lines and return the results.
+
+    Args:
+        lines (list[str]): Lines of the log.
+        repeat (int): Number of times to run every stage. The fastest run counts.
+
+    Returns:
+        dict: Lines per second and result count of every stage.
+    """
+    results = {"lines": len(lines), "stages": {}}
+    for name, func in (
+        ("prefilter", _prefilter),
+        ("combined pattern", _combined_pattern),
+        ("match_line", _match_line),
+        ("separate patterns", _separate_patterns),
+        ("baseline extraction", _baseline_extraction),
+        ("extraction", _extraction),
+        ("buffer extraction", _buffer_extraction),
+    ):
+        best = None
+        for _ in range(repeat):
+            start = time.perf_counter()
+            count = func(lines)
+            elapsed = time.perf_counter() - start
+            best = elapsed if best is None else min(best, elapsed)
+        lines_per_second = len(lines) / best if best else float("inf")
+        results["stages"][name] = {
+            "seconds": best,
+            "lines_per_second": lines_per_second,
+            "count": count,
+        }
+        print(f"{name:<20} {best:9.3f} s {lines_per_second:14,.0f} lines/s  ({count})", file=sys.stderr)
+    return results
+
+
+def parse_arguments() -> argparse.Namespace:
+    """Parse command line arguments.
+
+    Returns:
+        argparse.Namespace: The parsed arguments.
+    """
+    parser = argparse.ArgumentParser(
+        description="Benchmark the line matching of failed_tests.py on a CI log."
+    )
+    parser.add_argument(
+        "log",
+        help="Path to a log file, plain or gzip/xz compressed, or - for stdin.",
+    )
+    parser.add_argument(
+        "--max-lines",
+        type=int,
+        default=5_000_000,
+        help="Only read this many lines of the log (default: %(default)s).",
+    )
+    parser.add_argument(
+        "--repeat",
+        type=int,
+        default=3,
+        help="Number of times to run every stage (default: %(default)s).",
+    )
+    parser.add_argument(
+        "--json",
+        help="Path to write the results to as JSON.",
+    )
+    return parser.parse_args()
+
+
+def main() -> None:
+    """Main entry point for the script."""
+    args = parse_arguments()
+    lines = list(islice(failed_tests.iter_log_lines(args.log), args.max_lines))
+    results = run_benchmark(lines, args.repeat)
+    print(json.dumps(results, indent=2))
+    if args.json:
+        with open(args.json, mode="w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
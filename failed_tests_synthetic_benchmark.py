@@ -0,0 +1,578 @@
+#!/usr/bin/env python3
+"""Benchmark failed_tests.py on synthetic colcon logs of growing size.
+
+This script writes Jenkins console logs of a colcon build and test run with a
+configurable shape, so no real (huge, and possibly sensitive) nightly logs are
+needed. Every package's tests run through CTest in verbose mode, so test output
+has CTest's "N: " prefix, and each test uses one of the test frameworks
+failed_tests.py knows.
+
+The logs contain a mix of:
+  * colcon build output between the package blocks
+  * GTest, pytest, unittest, Catch2 and launch_testing tests, each with lines
+    of log noise, of which a configurable fraction fail
+  * CTest tests whose output is interleaved with the next test's, like
+    `ctest -j` prints them
+  * colcon's summary and `colcon test-result` lines at the end
+
+Every stage then runs in a fresh process on each log, and reports lines per
+second and the peak RSS of the process. Plain logs are memory-mapped, so the
+RSS includes the pages of the log that were read, and the resident memory that
+isn't backed by files is reported as well where /proc has it:
+  * package selection: failed_tests.iter_log_lines() for a tenth of the packages
+  * failed test names: failed_tests.summarize_log() without the index
+  * failure output: failed_tests.iter_failures() over the whole log
+  * index build: failed_tests.build_index()
+  * indexed output: failed_tests.iter_indexed_failures() with the output of every failure
+
+The failed tests every stage but package selection finds are compared with
+the ones written to the log, and the script fails if any are missing or extra.
+Besides a log of each size, a log of the smallest size with every test's
+output interleaved with the next one's is checked the same way.
+"""
+
+import argparse
+from dataclasses import dataclass, field
+import json
+import os
+import random
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+
+import failed_tests
+
+FRAMEWORKS = ("gtest", "pytest", "unittest", "catch2", "launch_testing")
+
+SIZE_SUFFIXES = {"K": 1 << 10, "M": 1 << 20, "G": 1 << 30}
+
+STAGES = (
+    "package selection",
+    "failed test names",
+    "failure output",
+    "index build",
+    "indexed output",
+)
+
+_NOISE = (
+    "[INFO] [{stamp}] [{node}]: Publishing: 'Hello World: {count}'",
+    "[DEBUG] [{stamp}] [rcl]: Subscription taking message",
+    "[INFO] [{stamp}] [{node}]: I heard: [Hello World: {count}]",
+    "[WARN] [{stamp}] [rmw_fastrtps_cpp]: Waited {count} ms for discovery",
+    "{path}/src/{node}.cpp:{count}: note: this is only a synthetic log line",
+)
+
+_D79 = "-" * 79
+
+
+@dataclass
+class LogShape:
+    """Shape of a synthetic log."""
+
+    size: int
+    packages: int
+    frameworks: tuple[str, ...]
+    failure_density: float
+    interleave: float
+    noise_lines: int
+    seed: int
+
+
+@dataclass
+class SyntheticLog:
+    """A generated log and what is known about it."""
+
+    path: str
+    size: int
+    lines: int
+    packages: list[str] = field(default_factory=list)
+    # (package, test) of every test a test framework reports as failed
+    failed_tests: set[tuple[str, str]] = field(default_factory=set)
+
+
+def parse_size(text: str) -> int:
+    """Parse a size such as 10M or 1G into bytes.
+
+    Args:
+        text (str): The size, with an optional K, M or G suffix.
+
+    Returns:
+        int: The size in bytes.
+    """
+    text = text.strip().upper().removesuffix("B")
+    if text and text[-1] in SIZE_SUFFIXES:
+        return int(float(text[:-1]) * SIZE_SUFFIXES[text[-1]])
+    return int(text)
+
+
+class _LogWriter:
+    """Generates the lines of a synthetic log, one package at a time."""
+
+    def __init__(self, shape: LogShape) -> None:
+        self.shape = shape
+        self.rng = random.Random(shape.seed)
+        self.stamp = 1_700_000_000.0
+
+    def _noise(self, node: str) -> list[str]:
+        lines = []
+        for _ in range(self.rng.randint(self.shape.noise_lines // 2, self.shape.noise_lines)):
+            self.stamp += self.rng.random() / 100
+            lines.append(self.rng.choice(_NOISE).format(
+                stamp=f"{self.stamp:.6f}", node=node, count=self.rng.randint(1, 9999),
+                path="/home/jenkins-agent/workspace/ws"))
+        return lines
+
+    def _gtest(self, name: str, fails: bool) -> tuple[list[str], list[str]]:
+        suite = f"Test{name.title().replace('_', '')}"
+        cases = [f"{suite}.case_{i}" for i in range(self.rng.randint(2, 6))]
+        failing = set(self.rng.sample(cases, self.rng.randint(1, len(cases)))) if fails else set()
+        lines = [f"[==========] Running {len(cases)} tests from 1 test suite."]
+        for case in cases:
+            lines.append(f"[ RUN      ] {case}")
+            lines += self._noise(name)
+            if case in failing:
+                lines += [
+                    f"/home/jenkins-agent/workspace/ws/src/{name}.cpp:{self.rng.randint(10, 500)}: Failure",
+                    "Expected equality of these values:",
+                    "  ret",
+                    "    Which is: 1",
+                    "  RCL_RET_OK",
+                    "    Which is: 0",
+                    f"[  FAILED  ] {case} ({self.rng.randint(1, 900)} ms)",
+                ]
+            else:
+                lines.append(f"[       OK ] {case} ({self.rng.randint(1, 900)} ms)")
+        lines.append(f"[==========] {len(cases)} tests from 1 test suite ran.")
+        lines.append(f"[  PASSED  ] {len(cases) - len(failing)} tests.")
+        if failing:
+            lines.append(f"[  FAILED  ] {len(failing)} tests, listed below:")
+            lines += [f"[  FAILED  ] {case}" for case in sorted(failing)]
+        return lines, sorted(failing)
+
+    def _pytest(self, name: str, fails: bool) -> tuple[list[str], list[str]]:
+        cases = [f"test_{name}_{i}" for i in range(self.rng.randint(2, 8))]
+        failing = sorted(self.rng.sample(cases, self.rng.randint(1, len(cases)))) if fails else []
+        lines = [
+            "============================= test session starts ==============================",
+            f"collected {len(cases)} items",
+            "",
+            f"test/test_{name}.py " + "".join("F" if c in failing else "." for c in cases),
+            "",
+        ]
+        lines += self._noise(name)
+        if failing:
+            lines.append("=================================== FAILURES ===================================")
+            for case in failing:
+                lines += [
+                    f"{'_' * 20} {case} {'_' * 20}",
+                    "",
+                    f"    def {case}():",
+                    ">       assert node.count_publishers('chatter') == 1",
+                    "E       AssertionError: assert 0 == 1",
+                    "",
+                    f"test/test_{name}.py:{self.rng.randint(10, 200)}: AssertionError",
+                ]
+            lines.append("=========================== short test summary info ============================")
+            lines += [f"FAILED test/test_{name}.py::{case} - AssertionError" for case in failing]
+        lines.append(f"========================= {len(failing)} failed, {len(cases) - len(failing)} passed in 1.00s =========================")
+        return lines, failing
+
+    def _unittest(self, name: str, fails: bool) -> tuple[list[str], list[str]]:
+        cases = [f"test_{name}_{i}" for i in range(self.rng.randint(2, 5))]
+        failing = sorted(self.rng.sample(cases, self.rng.randint(1, len(cases)))) if fails else []
+        lines = self._noise(name)
+        lines += [f"{case} (test_{name}.TestNode) ... {'FAIL' if case in failing else 'ok'}" for case in cases]
+        for case in failing:
+            lines += [
+                "",
+                "=" * 70,
+                f"FAIL: {case} (test_{name}.TestNode)",
+                "-" * 70,
+                "Traceback (most recent call last):",
+                f'  File "test/test_{name}.py", line {self.rng.randint(10, 200)}, in {case}',
+                "    self.assertEqual(proc_info['talker'].returncode, 0)",
+                "AssertionError: 1 != 0",
+            ]
+        lines += ["", "-" * 70, f"Ran {len(cases)} tests in 1.000s", ""]
+        lines.append(f"FAILED (failures={len(failing)})" if failing else "OK")
+        return lines, failing
+
+    def _catch2(self, name: str, fails: bool) -> tuple[list[str], list[str]]:
+        cases = [f"{name} case {i}" for i in range(self.rng.randint(2, 6))]
+        failing = sorted(self.rng.sample(cases, self.rng.randint(1, len(cases)))) if fails else []
+        lines = self._noise(name)
+        for case in failing:
+            source = f"/home/jenkins-agent/workspace/ws/src/{name}.cpp"
+            lines += [
+                _D79,
+                case,
+                _D79,
+                f"{source}:{self.rng.randint(10, 200)}",
+                "." * 79,
+                "",
+                f"{source}:{self.rng.randint(10, 200)}: FAILED:",
+                "  REQUIRE( v.size() == 6 )",
+                "with expansion:",
+                "  5 == 6",
+                "",
+            ]
+        lines += [
+            "=" * 79,
+            f"test cases: {len(cases)} | {len(cases) - len(failing)} passed | {len(failing)} failed",
+        ]
+        return lines, failing
+
+    def _launch_testing(self, name: str, fails: bool) -> tuple[list[str], list[str]]:
+        process = f"{name}_node-1"
+        lines = [f"[INFO] [launch]: All log files can be found below /tmp/launch_{name}"]
+        lines.append(f"[INFO] [{process}]: process started with pid [{self.rng.randint(100, 99999)}]")
+        lines += [f"[{process}] {line}" for line in self._noise(name)]
+        if fails:
+            lines.append(
+                f"[ERROR] [{process}]: process has died [pid {self.rng.randint(100, 99999)}, "
+                f"exit code -11, cmd '/opt/ros/lib/{name}/{name}_node']."
+            )
+            return lines, [process]
+        lines.append(f"[INFO] [{process}]: process has finished cleanly [pid {self.rng.randint(100, 99999)}]")
+        return lines, []
+
+    def package(self, package: str, budget: int) -> tuple[list[str], list[str]]:
+        """Generate the test output block of a package.
+
+        Args:
+            package (str): Name of the package.
+            budget (int): Approximate number of bytes the block should have.
+
+        Returns:
+            tuple[list[str], list[str]]: Lines of the block, and the failed tests.
+        """
+        shape = self.shape
+        tests = []
+        size = 0
+        while size < budget or not tests:
+            number = len(tests) + 1
+            framework = self.rng.choice(shape.frameworks)
+            name = f"test_{framework}_{number}"
+            fails = self.rng.random() < shape.failure_density
+            lines, failed = getattr(self, f"_{framework}")(name, fails)
+            lines = [f"{number}: Test command: /usr/bin/python3 -u run_test.py {name}"] + lines
+            tests.append((number, name, [f"{number}: {line}" for line in lines], failed))
+            size += sum(len(line) + 4 for line in lines)
+
+        out = [f"--- output: {package}", "UpdateCTestConfiguration  from :DartConfiguration.tcl"]
+        all_failed = []
+        i = 0
+        while i < len(tests):
+            group = [tests[i]]
+            # Interleave the output of this and the next test, like `ctest -j` does
+            if i + 1 < len(tests) and self.rng.random() < shape.interleave:
+                group.append(tests[i + 1])
+            for number, name, _, _ in group:
+                out += [f"test {number}", f"      Start {number}: {name}", ""]
+            outputs = [list(reversed(lines)) for _, _, lines, _ in group]
+            while any(outputs):
+                lines = self.rng.choice([lines for lines in outputs if lines])
+                out.append(lines.pop())
+            for number, name, _, failed in group:
+                result = "***Failed" if failed else "  Passed"
+                out.append(
+                    f"{number}/{len(tests)} Test #{number}: {name} {'.' * 20}{result}"
+                    f"    {self.rng.random():.2f} sec"
+                )
+                all_failed += failed
+            i += len(group)
+        failed_numbers = [(number, name) for number, name, _, failed in tests if failed]
+        out += ["", f"{100 - 100 * len(failed_numbers) // len(tests)}% tests passed, "
+                    f"{len(failed_numbers)} tests failed out of {len(tests)}", ""]
+        if failed_numbers:
+            out.append("The following tests FAILED:")
+            out += [f"\t{number:3} - {name} (Failed)" for number, name in failed_numbers]
+            out.append("Errors while running CTest")
+        out.append("---")
+        return out, all_failed
+
+    def build_section(self, packages: list[str]) -> list[str]:
+        """Generate the colcon build output that precedes the tests."""
+        lines = ["+ colcon build --event-handlers console_cohesion+"]
+        for package in packages:
+            lines += [f"Starting >>> {package}", f"[Processing: {package}]"]
+            lines += [
+                f"--- stderr: {package}",
+                f"/home/jenkins-agent/workspace/ws/src/{package}/src/node.cpp:{self.rng.randint(1, 300)}:"
+                f"{self.rng.randint(1, 80)}: warning: unused parameter 'argc' [-Wunused-parameter]",
+                "---",
+                f"Finished <<< {package} [{self.rng.random() * 60:.1f}s]",
+            ]
+        lines.append(f"Summary: {len(packages)} packages finished [10min 0s]")
+        return lines
+
+
+def build_log(path: str, shape: LogShape) -> SyntheticLog:
+    """Write a synthetic log with the given shape.
+
+    Args:
+        path (str): Path to write the log to.
+        shape (LogShape): Shape of the log.
+
+    Returns:
+        SyntheticLog: The log and what is known about its failures.
+    """
+    writer = _LogWriter(shape)
+    log = SyntheticLog(path=path, size=0, lines=0)
+    log.packages = [f"synthetic_pkg_{i:04d}" for i in range(shape.packages)]
+
+    with open(path, mode="w", encoding="utf-8") as f:
+
+        def write(lines: list[str]) -> None:
+            text = "\n".join(lines) + "\n"
+            f.write(text)
+            log.lines += len(lines)
+            log.size += len(text.encode("utf-8"))
+
+        write([
+            "Started by timer",
+            "Running as SYSTEM",
+            "Building remotely on linux-agent-1 in workspace /home/jenkins-agent/workspace/nightly_linux",
+        ])
+        write(writer.build_section(log.packages))
+        write(["+ colcon test --event-handlers console_cohesion+"])
+        test_budget = max(shape.size - log.size - 200 * shape.packages, shape.packages)
+        test_results = []
+        for package in log.packages:
+            write([f"Starting >>> {package}"])
+            lines, failed = writer.package(package, test_budget // shape.packages)
+            write(lines)
+            suffix = "\t[ with test failures ]" if failed else ""
+            write([f"Finished <<< {package} [{writer.rng.random() * 100:.1f}s]{suffix}"])
+            log.failed_tests.update((package, test) for test in failed)
+            test_results.append((package, len(failed)))
+
+        write([f"Summary: {len(log.packages)} packages finished [1h 0min]"])
+        write([
+            f"build/{package}/test_results/{package}/{package}.xunit.xml: "
+            f"{max(failures, 1) * 3} tests, 0 errors, {failures} failures, 0 skipped"
+            for package, failures in test_results
+        ])
+        write([
+            f"Summary: {len(log.failed_tests) * 3} tests, 0 errors, {len(log.failed_tests)} failures, 0 skipped",
+            "Finished: UNSTABLE",
+        ])
+    return log
+
+
+def _run_stage(stage: str, path: str, packages: list[str]) -> dict:
+    """Run one stage on a log in this process and return its results."""
+    start = time.perf_counter()
+    # (package, test) of each failure the stage found
+    found = None
+    if stage == "package selection":
+        count = sum(1 for _ in failed_tests.iter_log_lines(path, packages))
+    elif stage == "failed test names":
+        summary = failed_tests.summarize_log(path, use_index=False)
+        found = [(package, test) for package, tests in summary.failed_tests.items() for test in tests]
+    elif stage == "failure output":
+        found = [
+            (failure.package, failure.test)
+            for failure in failed_tests.iter_failures(failed_tests.iter_log_lines(path))
+        ]
+    elif stage == "index build":
+        found = [(entry["package"], entry["test"]) for entry in failed_tests.build_index(path)["failures"]]
+    elif stage == "indexed output":
+        index = failed_tests.load_index(path)
+        if index is None:
+            raise RuntimeError(f"{path} has no index, so index build must run first")
+        found = [
+            (failure.package, failure.test) for failure in failed_tests.iter_indexed_failures(path, index)
+        ]
+    else:
+        raise ValueError(f"Unknown stage {stage!r}")
+    seconds = time.perf_counter() - start
+    if found is not None:
+        count = len(found)
+        found = sorted(set(found))
+    max_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in bytes on macOS and in kilobytes elsewhere
+    if sys.platform != "darwin":
+        max_rss *= 1024
+    return {"seconds": seconds, "count": count, "found": found, "max_rss": max_rss, "rss_anon": _rss_anon()}
+
+
+def _rss_anon() -> int | None:
+    """Return the resident memory of this process that isn't backed by files, if known.
+
+    Pages of a memory-mapped log count towards the RSS, although the kernel
+    can drop them at any time, so this is the memory the stage really needs.
+    """
+    try:
+        with open("/proc/self/status", encoding="utf-8") as f:
+            for line in f:
+                if line.startswith("RssAnon:"):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+    return None
+
+
+def run_benchmark(log: SyntheticLog) -> dict:
+    """Run every stage on a log, each in a fresh process.
+
+    Args:
+        log (SyntheticLog): The log to benchmark.
+
+    Returns:
+        dict: Lines per second, peak RSS and result count of every stage, and
+            the failed tests each stage missed or found that didn't fail.
+    """
+    selected = log.packages[::10]
+    results = {
+        "size": log.size,
+        "lines": log.lines,
+        "packages": len(log.packages),
+        "expected_failures": len(log.failed_tests),
+        "stages": {},
+    }
+    for stage in STAGES:
+        output = subprocess.run(
+            [sys.executable, os.path.abspath(__file__), "--run-stage", stage, log.path, *selected],
+            check=True,
+            stdout=subprocess.PIPE,
+            text=True,
+        ).stdout
+        result = json.loads(output)
+        result["lines_per_second"] = log.lines / result["seconds"] if result["seconds"] else float("inf")
+        found = result.pop("found")
+        if found is not None:
+            found = {tuple(entry) for entry in found}
+            result["missing"] = sorted(log.failed_tests - found)
+            result["extra"] = sorted(found - log.failed_tests)
+        results["stages"][stage] = result
+        anon = "" if result["rss_anon"] is None else f" ({result['rss_anon'] / (1 << 20):.1f} MB anon)"
+        print(
+            f"{log.size / (1 << 20):8.0f} MB  {stage:<20} {result['seconds']:9.3f} s "
+            f"{result['lines_per_second']:14,.0f} lines/s {result['max_rss'] / (1 << 20):8.1f} MB RSS"
+            f"{anon}  ({result['count']})",
+            file=sys.stderr,
+        )
+        for name in ("missing", "extra"):
+            for package, test in result.get(name, []):
+                print(f"{'':10}{name}: {package}: {test}", file=sys.stderr)
+    return results
+
+
+def parse_arguments() -> argparse.Namespace:
+    """Parse command line arguments.
+
+    Returns:
+        argparse.Namespace: The parsed arguments.
+    """
+    parser = argparse.ArgumentParser(
+        description="Benchmark failed_tests.py on synthetic colcon logs of growing size."
+    )
+    parser.add_argument(
+        "--sizes",
+        nargs="+",
+        type=parse_size,
+        default=[parse_size("10M"), parse_size("100M"), parse_size("1G")],
+        help="Sizes of the logs to generate, e.g. 10M or 1G (default: 10M 100M 1G).",
+    )
+    parser.add_argument(
+        "--packages",
+        type=int,
+        default=300,
+        help="Number of packages in each log (default: %(default)s).",
+    )
+    parser.add_argument(
+        "--frameworks",
+        nargs="+",
+        choices=FRAMEWORKS,
+        default=list(FRAMEWORKS),
+        help="Test frameworks the tests use (default: all of them).",
+    )
+    parser.add_argument(
+        "--failure-density",
+        type=float,
+        default=0.02,
+        help="Fraction of tests that fail (default: %(default)s).",
+    )
+    parser.add_argument(
+        "--interleave",
+        type=float,
+        default=0.1,
+        help="Fraction of tests whose output is interleaved with the next test's (default: %(default)s).",
+    )
+    parser.add_argument(
+        "--noise-lines",
+        type=int,
+        default=40,
+        help="Maximum number of log lines of each test case (default: %(default)s).",
+    )
+    parser.add_argument(
+        "--seed",
+        type=int,
+        default=0,
+        help="Random seed for the generated logs (default: %(default)s).",
+    )
+    parser.add_argument(
+        "--output-dir",
+        help="Directory to keep the generated logs in, e.g. for failed_tests_benchmark.py "
+        "(default: a temporary directory that is removed afterwards).",
+    )
+    parser.add_argument(
+        "--json",
+        help="Path to write the results to as JSON.",
+    )
+    parser.add_argument("--run-stage", nargs="+", help=argparse.SUPPRESS)
+    return parser.parse_args()
+
+
+def main() -> None:
+    """Main entry point for the script."""
+    args = parse_arguments()
+    if args.run_stage:
+        stage, path, *packages = args.run_stage
+        print(json.dumps(_run_stage(stage, path, packages)))
+        return
+
+    logs = [(f"synthetic_{size}", size, args.interleave) for size in args.sizes]
+    # Every test's output interleaved, where a test is most easily taken for another
+    logs.append((f"synthetic_{min(args.sizes)}_interleaved", min(args.sizes), 1.0))
+    results = []
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        directory = args.output_dir or tmp_dir
+        os.makedirs(directory, exist_ok=True)
+        for name, size, interleave in logs:
+            shape = LogShape(
+                size=size,
+                packages=args.packages,
+                frameworks=tuple(args.frameworks),
+                failure_density=args.failure_density,
+                interleave=interleave,
+                noise_lines=args.noise_lines,
+                seed=args.seed,
+            )
+            start = time.perf_counter()
+            log = build_log(os.path.join(directory, f"{name}.log"), shape)
+            print(
+                f"{log.size / (1 << 20):8.0f} MB  {'generate':<20} {time.perf_counter() - start:9.3f} s",
+                file=sys.stderr,
+            )
+            result = run_benchmark(log)
+            result["shape"] = vars(shape)
+            results.append(result)
+
+    print(json.dumps(results, indent=2))
+    if args.json:
+        with open(args.json, mode="w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+    wrong = [
+        result for result in results
+        if any(stage.get("missing") or stage.get("extra") for stage in result["stages"].values())
+    ]
+    if wrong:
+        sys.exit(f"{len(wrong)} of {len(results)} logs had missing or extra failed tests")
+
+
+if __name__ == "__main__":
+    main()
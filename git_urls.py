@@ -0,0 +1,34 @@
+"""Git URL helpers shared by the scripts in this repo.
+
+Scripts that compare repositories by URL use normalize_git_url() so they all
+agree on which spellings name the same repository.
+"""
+
+import re
+
+
+def normalize_git_url(url: str) -> str:
+    """Normalize a git URL so different spellings of the same remote compare equal.
+
+    The scheme, user, trailing slashes and `.git` suffix are dropped, scp-like
+    `git@host:path` URLs are rewritten as `host/path`, and the host is lower cased.
+    The path keeps its case, since it is case sensitive on many hosts.
+
+    Args:
+        url (str): The Git repository URL.
+
+    Returns:
+        str: The normalized URL, for example `github.com/ros2/rclcpp`.
+    """
+    url = url.strip().rstrip("/")
+    if url.endswith(".git"):
+        url = url[: -len(".git")]
+    scheme_match = re.match(r"^[a-zA-Z][a-zA-Z0-9+.-]*://", url)
+    if scheme_match:
+        url = url[scheme_match.end():]
+    elif re.match(r"^[^/]+:", url):
+        # scp-like syntax: [user@]host:path
+        url = url.replace(":", "/", 1)
+    host, sep, path = url.partition("/")
+    host = host.rpartition("@")[2].lower()
+    return f"{host}{sep}{path}"
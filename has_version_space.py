@@ -6,36 +6,40 @@ from dataclasses import dataclass
 from functools import cache
 import sys
 
-from rosdistro import get_index, get_index_url, get_distribution_file
 import requests
 import yaml
 
-
-@cache
-def fetch_distribution(distro_name):
-    index_url = get_index_url()
-    index = get_index(index_url)
-    return get_distribution_file(index, distro_name)
+from git_urls import normalize_git_url
+from rosdistro_cache import add_cache_arguments, configure_cache, fetch_distribution
 
 
-def get_release_version_by_source_url(distro_name, target_git_url):
+@cache
+def release_versions_by_source_url(distro_name):
     """
-    Finds the release version of a ROS package based on its source repository URL.
+    Indexes the release version of every repository in a distribution by its normalized source URL.
+
+    The version is None for repositories that have a source entry but no released version.
     """
     dist = fetch_distribution(distro_name)
-
+    versions = {}
     for repo_name, repo_data in dist.repositories.items():
         source_repo = repo_data.source_repository
+        if not source_repo or not source_repo.url:
+            continue
+        release_repo = repo_data.release_repository
+        version = release_repo.version if release_repo and release_repo.version else None
+        # Like a search through the distribution file, the first repository with the URL wins
+        versions.setdefault(normalize_git_url(source_repo.url), version)
+    return versions
 
-        # Check if a source entry exists and matches the target URL
-        if source_repo and source_repo.url == target_git_url:
-            release_repo = repo_data.release_repository
-            if release_repo and release_repo.version:
-                return release_repo.version
-            else:
-                return None
 
-    return None
+def get_release_version_by_source_url(distro_name, target_git_url):
+    """
+    Finds the release version of a ROS package based on its source repository URL.
+    """
+    if not target_git_url:
+        return None
+    return release_versions_by_source_url(distro_name).get(normalize_git_url(target_git_url))
 
 
 @dataclass
@@ -108,45 +112,72 @@ def check_version_space(distro_version, rolling_version):
         return False
 
 
+def version_space_pairs(distros):
+    """
+    Lists the (older, newer) pairs of distros to check for version space.
+
+    Distros are ordered oldest to newest, and every distro is compared with each newer one.
+    """
+    return [
+        (older, newer)
+        for i, older in enumerate(distros)
+        for newer in distros[i + 1:]
+    ]
+
+
+def version_space_column(older, newer):
+    if newer == 'rolling':
+        return f'{older}_has_version_space'
+    return f'{older}_{newer}_has_version_space'
+
+
 def parse_arguments():
     parser = argparse.ArgumentParser(
-        description='Check if there is sufficient version space between a ROS distro and Rolling.'
+        description='Check if there is sufficient version space between ROS distros and Rolling.'
     )
-    parser.add_argument('--rosdistro', required=True, help='The name of the target ROS distribution (e.g., lyrical).')
-    parser.add_argument('--repos', help='Path to a .repos file containing target git URLs.')
+    parser.add_argument(
+        '--rosdistro', required=True, nargs='+',
+        help='The names of the target ROS distributions from oldest to newest (e.g., jazzy kilted lyrical).')
+    parser.add_argument(
+        '--repos',
+        help='Path to a .repos file containing target git URLs. '
+             'Defaults to ros2.repos of the newest target distribution.')
+    add_cache_arguments(parser)
     return parser.parse_args()
 
 
 def main():
     args = parse_arguments()
+    configure_cache(args)
+
+    # Every distro is loaded and indexed once no matter how often it is listed
+    distros = [d for d in dict.fromkeys(args.rosdistro) if d != 'rolling'] + ['rolling']
+    pairs = version_space_pairs(distros)
 
     if args.repos:
         repos = repos_from_file(args.repos)
     else:
-        repos = repos_from_ros2_slash_ros2(args.rosdistro)
+        repos = repos_from_ros2_slash_ros2(distros[-2] if len(distros) > 1 else 'rolling')
 
     # Write output as CSV to stdout
     writer = csv.writer(sys.stdout)
-    header = [
-        'git_url',
-        f'{args.rosdistro}_version',
-        'rolling_version',
-        f'{args.rosdistro}_has_version_space'
-    ]
+    header = ['git_url']
+    header += [f'{distro}_version' for distro in distros]
+    header += [version_space_column(older, newer) for older, newer in pairs]
     writer.writerow(header)
 
     for repo in repos:
-        distro_version = get_release_version_by_source_url(args.rosdistro, repo.url)
-        rolling_version = get_release_version_by_source_url('rolling', repo.url)
-
-        has_space = check_version_space(distro_version, rolling_version)
-
-        writer.writerow([
-            repo.url,
-            distro_version if distro_version else 'None',
-            rolling_version if rolling_version else 'None',
-            'TRUE' if has_space else 'FALSE'
-        ])
+        versions = {
+            distro: get_release_version_by_source_url(distro, repo.url)
+            for distro in distros
+        }
+        row = [repo.url]
+        row += [versions[distro] if versions[distro] else 'None' for distro in distros]
+        row += [
+            'TRUE' if check_version_space(versions[older], versions[newer]) else 'FALSE'
+            for older, newer in pairs
+        ]
+        writer.writerow(row)
 
 
 if __name__ == "__main__":
@@ -0,0 +1,201 @@
+"""
+On-disk cache of the rosdistro index and distribution files shared by the scripts in this repo.
+
+Files are kept in ~/.cache/scripts-and-stuff/rosdistro (or $XDG_CACHE_HOME), one
+body and one metadata file per URL. A cached file younger than the TTL is used as
+is. An older one is revalidated with ETag/If-Modified-Since, so an unchanged
+multi-megabyte distribution.yaml costs a 304 instead of a download. In offline
+mode only the cache is used.
+
+    from rosdistro_cache import add_cache_arguments, configure_cache, fetch_distribution
+
+    add_cache_arguments(parser)
+    args = parser.parse_args()
+    configure_cache(args)
+    dist = fetch_distribution('rolling')
+"""
+
+from functools import cache
+import hashlib
+import json
+import os
+import sys
+import tempfile
+import time
+from urllib.parse import urlparse
+
+from rosdistro import get_index_url, load_url
+from rosdistro.distribution_file import create_distribution_file
+from rosdistro.index import Index
+import requests
+import yaml
+
+
+DEFAULT_TTL = 15 * 60
+TIMEOUT = 30
+
+
+def default_cache_dir():
+    cache_home = os.environ.get('XDG_CACHE_HOME') or os.path.join(os.path.expanduser('~'), '.cache')
+    return os.path.join(cache_home, 'scripts-and-stuff', 'rosdistro')
+
+
+def _replace_file(path, data):
+    # Write a unique temporary file then rename it, so a concurrent or
+    # interrupted run never sees half a file
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path))
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+    except BaseException:
+        os.unlink(tmp_path)
+        raise
+
+
+class RosdistroCache:
+    """
+    Loads URLs through a directory of cached responses.
+    """
+
+    def __init__(self, cache_dir=None, ttl=DEFAULT_TTL, offline=False):
+        self.cache_dir = cache_dir or default_cache_dir()
+        self.ttl = ttl
+        self.offline = offline
+
+    def _paths(self, url):
+        key = hashlib.sha256(url.encode('utf-8')).hexdigest()
+        base = os.path.join(self.cache_dir, key)
+        return base + '.body', base + '.json'
+
+    def _read(self, url):
+        body_path, meta_path = self._paths(url)
+        try:
+            with open(meta_path, 'r', encoding='utf-8') as f:
+                meta = json.load(f)
+            with open(body_path, 'rb') as f:
+                body = f.read()
+        except (OSError, ValueError):
+            return None, None
+        if meta.get('url') != url:
+            return None, None
+        # A body and metadata of different writes don't belong together
+        if meta.get('sha256') != hashlib.sha256(body).hexdigest():
+            return None, None
+        return body, meta
+
+    def _write(self, url, body, meta):
+        body_path, meta_path = self._paths(url)
+        os.makedirs(self.cache_dir, exist_ok=True)
+        # The metadata goes last, with the digest of the body it belongs to
+        if body is not None:
+            _replace_file(body_path, body)
+            meta['sha256'] = hashlib.sha256(body).hexdigest()
+        _replace_file(meta_path, json.dumps(meta).encode('utf-8'))
+
+    def load_url(self, url):
+        """
+        Returns the decoded contents of a URL, from the cache if it is fresh or still valid.
+        """
+        if urlparse(url).scheme not in ('http', 'https'):
+            # Local files are cheaper to read than to cache
+            return load_url(url)
+
+        body, meta = self._read(url)
+        if self.offline:
+            if body is None:
+                raise RuntimeError(f'{url} is not cached, run once without --offline')
+            return body.decode('utf-8')
+        if body is not None and time.time() - meta['fetched'] < self.ttl:
+            return body.decode('utf-8')
+
+        headers = {}
+        if body is not None:
+            if meta.get('etag'):
+                headers['If-None-Match'] = meta['etag']
+            if meta.get('last_modified'):
+                headers['If-Modified-Since'] = meta['last_modified']
+        try:
+            response = requests.get(url, headers=headers, timeout=TIMEOUT)
+            if response.status_code != 304:
+                response.raise_for_status()
+        except requests.RequestException as e:
+            if body is None:
+                raise
+            print(f'# WARNING: Using stale cache of {url}: {e}', file=sys.stderr)
+            return body.decode('utf-8')
+
+        if response.status_code == 304:
+            meta['fetched'] = time.time()
+            self._write(url, None, meta)
+            return body.decode('utf-8')
+
+        body = response.content
+        self._write(url, body, {
+            'url': url,
+            'etag': response.headers.get('ETag'),
+            'last_modified': response.headers.get('Last-Modified'),
+            'fetched': time.time(),
+        })
+        return body.decode('utf-8')
+
+    def get_index(self, url=None):
+        """
+        Loads the rosdistro index like rosdistro.get_index().
+        """
+        url = url or get_index_url()
+        data = yaml.safe_load(self.load_url(url))
+        return Index(data, os.path.dirname(url), url_query=urlparse(url).query)
+
+    def get_distribution_file(self, distro_name, index=None):
+        """
+        Loads a distribution file like rosdistro.get_distribution_file().
+        """
+        index = index or self.get_index()
+        if distro_name not in index.distributions:
+            raise RuntimeError(f"Unknown release: '{distro_name}'. Valid release names are: {', '.join(sorted(index.distributions))}")
+        urls = index.distributions[distro_name]['distribution']
+        if isinstance(urls, list):
+            data = [yaml.safe_load(self.load_url(url)) for url in urls]
+        else:
+            data = yaml.safe_load(self.load_url(urls))
+        return create_distribution_file(distro_name, data)
+
+
+_cache = RosdistroCache()
+
+
+def add_cache_arguments(parser):
+    """
+    Adds the options of configure_cache() to an argument parser.
+    """
+    group = parser.add_argument_group('rosdistro cache')
+    group.add_argument(
+        '--cache-dir', default=None,
+        help=f'Directory to cache rosdistro files in (default: {default_cache_dir()}).')
+    group.add_argument(
+        '--cache-ttl', type=float, default=DEFAULT_TTL,
+        help='Seconds a cached rosdistro file is used without revalidation; 0 always revalidates (default: %(default)s).')
+    group.add_argument(
+        '--offline', action='store_true',
+        help='Only use cached rosdistro files, fail if one is missing.')
+
+
+def configure_cache(args):
+    """
+    Configures the cache used by fetch_index() and fetch_distribution() from parsed arguments.
+    """
+    global _cache
+    _cache = RosdistroCache(cache_dir=args.cache_dir, ttl=args.cache_ttl, offline=args.offline)
+    fetch_index.cache_clear()
+    fetch_distribution.cache_clear()
+
+
+@cache
+def fetch_index():
+    return _cache.get_index()
+
+
+@cache
+def fetch_distribution(distro_name):
+    return _cache.get_distribution_file(distro_name, fetch_index())
@@ -3,19 +3,15 @@
 import argparse
 from dataclasses import dataclass
 from datetime import datetime
-from functools import cache
+import os
 import sys
 
-from rosdistro import get_index, get_index_url, get_distribution_file
 import requests
 import yaml
 
-
-@cache
-def fetch_distribution(distro_name):
-    index_url = get_index_url()
-    index = get_index(index_url)
-    return get_distribution_file(index, distro_name)
+# rosdistro_cache.py lives next to the scripts one directory up
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from rosdistro_cache import add_cache_arguments, configure_cache, fetch_distribution  # noqa: E402
 
 
 def get_track(url):
@@ -151,11 +147,13 @@ def parse_arguments():
     parser.add_argument('--rosdistro', required=True, help='The name of the ROS distribution (e.g., humble, rolling).')
     parser.add_argument('--input-repos', help='Path to a file containing target git URLs.')
     parser.add_argument('--pin', action='append', help='Pin a repository to a specific version. Format: repo_name=version')
+    add_cache_arguments(parser)
     return parser.parse_args()
 
 
 def main():
     args = parse_arguments()
+    configure_cache(args)
 
     if args.input_repos:
         repos = repos_from_file(args.input_repos)
@@ -2,6 +2,7 @@
 
 import argparse
 from datetime import date, timedelta
+import os
 import re
 from string import Template
 import sys
@@ -9,6 +10,10 @@ import sys
 import requests
 import rosdistro
 
+# rosdistro_cache.py lives next to the scripts one directory up
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from rosdistro_cache import add_cache_arguments, configure_cache, fetch_distribution  # noqa: E402
+
 
 title_template = "New Packages for ${distro_title} ${sync_date}"
 
@@ -64,13 +69,11 @@ def non_dbgsym_pkgs(content, distro_lower):
 
 
 def get_ubuntu_codename(distro_lower):
-    index = rosdistro.get_index(rosdistro.get_index_url())
     try:
-        cached_dist = rosdistro.get_cached_distribution(index, distro_lower)
+        dist_file = fetch_distribution(distro_lower)
     except RuntimeError as e:
         sys.exit(f"Failed to get distribution data: {e}")
 
-    dist_file = cached_dist._distribution_file
     data = dist_file.get_data()
     # Override version to 1 for ReleaseFile constructor compatibility
     data['version'] = 1
@@ -92,11 +95,13 @@ def parse_arguments():
         required=True,
         help='The name of the ROS distribution (e.g., noetic, humble, rolling).'
     )
+    add_cache_arguments(parser)
     return parser.parse_args()
 
 
 def main():
     args = parse_arguments()
+    configure_cache(args)
     rosdistro = args.rosdistro
     distro_lower = rosdistro.lower()
     distro_title = rosdistro.capitalize()